@@ -17,7 +17,10 @@ python src/manage.py shell -c "from authentication.models import Customer; \
 
 cd /app/src
 
-if [ "$PRODUCTION" = "True" ]; then
+if [ "$PRODUCTION" = "True" ] && [ "$ASGI" = "True" ]; then
+    echo "🟡 Iniciando em modo PRODUÇÃO (ASGI)..."
+    gunicorn --config gunicorn_config.py --worker-class uvicorn_worker.UvicornWorker aiqfome.asgi:application
+elif [ "$PRODUCTION" = "True" ]; then
     echo "🟡 Iniciando em modo PRODUÇÃO..."
     gunicorn --config gunicorn_config.py aiqfome.wsgi:application
 else
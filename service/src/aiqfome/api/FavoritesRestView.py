@@ -1,15 +1,41 @@
-from django.core.cache import cache
+from django.conf import settings
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from aiqfome.models import Favorites
-from aiqfome.serializers import FavoritesSerializer
-from utils.cache_utils import update_favorites_cache_for_user
+from aiqfome.serializers import (
+    FavoritesBulkCreateSerializer,
+    FavoritesBulkDeactivateSerializer,
+    FavoritesSerializer,
+)
+from utils import fieldsets
+from utils.cache_utils import (
+    get_favorites_for_user,
+    get_favorites_page,
+    patch_favorites_cache_for_user,
+    update_favorites_cache_for_user,
+)
+from utils.fieldsets import FieldsQuerySerializer
+
+
+class FavoritesCursorPagination(CursorPagination):
+    """Paginação por cursor dos favoritos, do mais recente para o mais antigo.
+
+    Usa o `id` (uuid7, ordenado pelo tempo) como chave, então cada página é uma
+    busca `id < cursor` no índice, sem OFFSET.
+    """
+
+    ordering = "-id"
+    page_size = settings.FAVORITES_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.FAVORITES_MAX_PAGE_SIZE
 
 
 class FavoritesRestView(viewsets.ModelViewSet):
@@ -39,10 +65,11 @@ class FavoritesRestView(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = FavoritesSerializer
     queryset = Favorites.objects.none()
+    pagination_class = FavoritesCursorPagination
 
     def get_object(self):
         pk = self.kwargs.get("pk")
-        obj = get_object_or_404(Favorites, pk=pk)
+        obj = get_object_or_404(Favorites.objects.select_related("snapshot"), pk=pk)
         return obj
 
     def perform_create(self, serializer):
@@ -56,13 +83,21 @@ class FavoritesRestView(viewsets.ModelViewSet):
     @swagger_auto_schema(
         tags=["Favorites"],
         operation_summary="List active favorites",
-        operation_description="Retrieve a list of active favorite products for the authenticated user.",
+        operation_description="""Retrieve a list of active favorite products for the authenticated user.
+        Send `cursor` and/or `page_size` to get a page (newest first) instead of the whole list.
+        Use `fields` or `exclude` to return only part of each favorite
+        (e.g. `?fields=id,product_id,product_data.title,product_data.price,product_data.image`).""",
+        query_serializer=FieldsQuerySerializer,
     )
     def list(self, request, *args, **kwargs):
-        cache_key = f"fakestore:all_products:{request.user.id}"
-        data = cache.get(cache_key)
-        if not data:
-            data = update_favorites_cache_for_user(request.user.id)
+        query = FieldsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        selected = fieldsets.projection(dict(query.validated_data))
+
+        if {"cursor", "page_size"} & request.query_params.keys():
+            return Response(get_favorites_page(request, self.paginator, selected))
+
+        data = get_favorites_for_user(request.user.id, selected)
 
         return Response(data)
 
@@ -73,18 +108,75 @@ class FavoritesRestView(viewsets.ModelViewSet):
     )
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
-        transaction.on_commit(lambda: update_favorites_cache_for_user(request.user.id))
+        transaction.on_commit(
+            lambda: patch_favorites_cache_for_user(
+                request.user.id, add=dict(response.data)
+            )
+        )
 
         return response
 
+    @swagger_auto_schema(
+        tags=["Favorites"],
+        operation_summary="Add favorites in bulk",
+        operation_description="""Add several products to the authenticated user's favorites in a single call.
+        Products are resolved in one batch and each item reports its own status
+        (`created`, `reactivated`, `already_favorited`, `not_found` or `unavailable`).""",
+        request_body=FavoritesBulkCreateSerializer,
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        serializer = FavoritesBulkCreateSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+
+        if any(result["status"] in ("created", "reactivated") for result in results):
+            transaction.on_commit(
+                lambda: update_favorites_cache_for_user(request.user.id)
+            )
+
+        return Response({"results": results})
+
+    @swagger_auto_schema(
+        tags=["Favorites"],
+        operation_summary="Deactivate favorites in bulk",
+        operation_description="""Deactivate (soft delete) several favorites of the authenticated user in a single call.
+        Send `ids` with the favorite IDs, or `all: true` to clear every active favorite.""",
+        request_body=FavoritesBulkDeactivateSerializer,
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-deactivate")
+    def bulk_deactivate(self, request):
+        serializer = FavoritesBulkDeactivateSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+
+        if result["deactivated"]:
+            transaction.on_commit(
+                lambda: update_favorites_cache_for_user(
+                    request.user.id, invalidate=True
+                )
+            )
+
+        return Response(result)
+
     @swagger_auto_schema(
         tags=["Favorites"],
         operation_summary="Retrieve a favorite by ID",
-        operation_description="Retrieve details of a favorite product by its ID.",
+        operation_description="""Retrieve details of a favorite product by its ID.
+        Use `fields` or `exclude` to return only part of it.""",
+        query_serializer=FieldsQuerySerializer,
     )
     def retrieve(self, request, *args, **kwargs):
+        query = FieldsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        selected = fieldsets.projection(dict(query.validated_data))
+
         instance = self.get_object()
-        if instance.customer != request.user and not request.user.is_superuser:
+        if instance.customer_id != request.user.id and not request.user.is_superuser:
             raise PermissionDenied(
                 {"detail": "You do not have permission to perform this action."}
             )
@@ -95,7 +187,7 @@ class FavoritesRestView(viewsets.ModelViewSet):
             )
 
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        return Response(fieldsets.project(serializer.data, selected))
 
     @swagger_auto_schema(auto_schema=None)
     def update(self, request, *args, **kwargs):
@@ -112,14 +204,18 @@ class FavoritesRestView(viewsets.ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.customer != request.user and not request.user.is_superuser:
-            return PermissionDenied(
+        if instance.customer_id != request.user.id and not request.user.is_superuser:
+            raise PermissionDenied(
                 {"detail": "You do not have permission to perform this action."}
             )
 
         instance.active = False
-        instance.save()
+        instance.save(update_fields=["active", "updated_at"])
 
-        transaction.on_commit(lambda: update_favorites_cache_for_user(request.user.id))
+        transaction.on_commit(
+            lambda: patch_favorites_cache_for_user(
+                instance.customer_id, remove=str(instance.pk)
+            )
+        )
 
         return Response(status=status.HTTP_204_NO_CONTENT)
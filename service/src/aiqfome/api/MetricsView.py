@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.views import APIView
+
+from utils import metrics
+
+
+class MetricsView(APIView):
+    """Expõe as métricas de cache, upstream e endpoints no formato de texto do Prometheus.
+
+    Os valores são somados entre todos os workers (ver `utils.metrics`). Apenas
+    usuários staff têm acesso, a menos que `METRICS_PUBLIC` esteja ligado (ex.: o
+    scraper acessa por uma rede interna).
+    """
+
+    swagger_schema = None
+
+    def get_permissions(self):
+        if settings.METRICS_PUBLIC:
+            return [AllowAny()]
+        return [IsAdminUser()]
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -1 +1,2 @@
 from aiqfome.api.FavoritesRestView import FavoritesRestView  # noqa: F401
+from aiqfome.api.MetricsView import MetricsView  # noqa: F401
@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from aiqfome.models import Favorites, ProductSnapshot
+from utils import product_service
+from utils.cache_utils import bump_favorites_cache_versions
+from utils.fakestore_client import UpstreamError
+from utils.hashing import content_hash
+
+
+class Command(BaseCommand):
+    """Atualiza os snapshots de produto dos favoritos ativos com o catálogo atual.
+
+    Os favoritos são percorridos em blocos por `id` (keyset, sem OFFSET) e o hash
+    do snapshot de cada um é comparado com o hash do produto no catálogo
+    recarregado no upstream (nunca uma entrada velha do cache; com a API fora, o
+    comando aborta). Apenas os favoritos cujo produto mudou são apontados para o
+    snapshot novo, com um UPDATE em lote por bloco, e o cache de favoritos dos
+    usuários afetados é invalidado em lote. Antes do UPDATE, os favoritos do bloco
+    são lidos de novo com `SELECT ... FOR UPDATE`, para não sobrescrever uma
+    desativação concorrente. Produtos que saíram do catálogo mantêm o último
+    snapshot.
+
+    Pode ser agendado (ex.: cron) junto com o `sync_products`.
+
+    Uso:
+    ```bash
+        python manage.py refresh_favorite_snapshots --chunk-size 1000
+    ```
+    """
+
+    help = "Atualiza os dados de produto dos favoritos com o catálogo atual."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Quantidade de favoritos lidos e atualizados por vez.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            catalog = product_service.refresh_catalog()
+        except UpstreamError as e:
+            raise CommandError(f"Erro ao acessar API externa: {e}")
+        if catalog.is_fallback:
+            raise CommandError(
+                "API externa indisponível; o catálogo em cache pode estar desatualizado."
+            )
+
+        products = {
+            product["id"]: {key: value for key, value in product.items() if key != "id"}
+            for product in catalog.data
+        }
+        hashes = {pk: content_hash(data) for pk, data in products.items()}
+        snapshots = {}
+
+        scanned = updated = invalidated = 0
+        last_id = None
+        while True:
+            queryset = Favorites.objects.filter(active=True).order_by("id")
+            if last_id is not None:
+                queryset = queryset.filter(id__gt=last_id)
+            chunk = list(
+                queryset.values_list("id", "product_id", "snapshot_id")[
+                    : options["chunk_size"]
+                ]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            scanned += len(chunk)
+
+            candidates = [
+                (pk, product_id)
+                for pk, product_id, snapshot_id in chunk
+                if product_id in hashes and snapshot_id != hashes[product_id]
+            ]
+            if not candidates:
+                continue
+
+            missing = {product_id for _, product_id in candidates} - snapshots.keys()
+            for pk, snapshot in zip(
+                missing, ProductSnapshot.for_many([products[pk] for pk in missing])
+            ):
+                snapshots[pk] = snapshot
+
+            with transaction.atomic():
+                stale = [
+                    favorite
+                    for favorite in Favorites.objects.select_for_update().filter(
+                        id__in=[pk for pk, _ in candidates], active=True
+                    )
+                    if favorite.snapshot_id != hashes[favorite.product_id]
+                ]
+                if not stale:
+                    continue
+
+                now = timezone.now()
+                for favorite in stale:
+                    favorite.snapshot = snapshots[favorite.product_id]
+                    favorite.updated_at = now
+
+                bulk_update_with_history(
+                    stale,
+                    Favorites,
+                    ["snapshot", "updated_at"],
+                    default_change_reason="Atualização dos dados do produto",
+                    default_date=now,
+                )
+            affected = {favorite.customer_id for favorite in stale}
+            bump_favorites_cache_versions(affected)
+
+            updated += len(stale)
+            invalidated += len(affected)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Favoritos verificados: {scanned}, {updated} atualizados "
+                f"({invalidated} invalidações de cache)."
+            )
+        )
@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from aiqfome.models import Product
+from utils import fakestore_client
+from utils.fakestore_client import UpstreamError
+from utils.hashing import content_hash
+
+
+class Command(BaseCommand):
+    """Sincroniza a tabela `Product` com o catálogo da FakeStore API.
+
+    A sincronização é incremental: produtos novos são inseridos, apenas as linhas
+    cujo `content_hash` mudou são atualizadas e produtos que saíram do catálogo são
+    removidos. As entradas do cache do proxy afetadas são invalidadas.
+
+    Uso:
+    ```bash
+        python manage.py sync_products
+    ```
+    """
+
+    help = "Sincroniza incrementalmente a tabela de produtos com a FakeStore API."
+
+    def handle(self, *args, **options):
+        try:
+            response = fakestore_client.get()
+        except UpstreamError as e:
+            raise CommandError(f"Erro ao acessar API externa: {e}")
+        if response.status_code != 200:
+            raise CommandError(f"FakeStore respondeu {response.status_code}.")
+
+        catalog = {product["id"]: product for product in response.json()}
+        hashes = {pk: content_hash(product) for pk, product in catalog.items()}
+        existing = dict(Product.objects.values_list("id", "content_hash"))
+        now = timezone.now()
+
+        to_create = [
+            Product(id=pk, data=catalog[pk], content_hash=hashes[pk], synced_at=now)
+            for pk in catalog.keys() - existing.keys()
+        ]
+        to_update = [
+            Product(id=pk, data=catalog[pk], content_hash=hashes[pk], synced_at=now)
+            for pk in catalog.keys() & existing.keys()
+            if existing[pk] != hashes[pk]
+        ]
+        removed = existing.keys() - catalog.keys()
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create)
+            Product.objects.bulk_update(
+                to_update, fields=["data", "content_hash", "synced_at"]
+            )
+            Product.objects.filter(id__in=removed).delete()
+
+        changed = [product.id for product in to_create + to_update] + list(removed)
+        if changed:
+            cache.delete_many(
+                ["fakestore:all_products"]
+                + [f"fakestore:product:{pk}" for pk in changed]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Produtos sincronizados: {len(to_create)} criados, "
+                f"{len(to_update)} atualizados, {len(removed)} removidos, "
+                f"{len(catalog) - len(to_create) - len(to_update)} inalterados."
+            )
+        )
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 15:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Product",
+            fields=[
+                (
+                    "id",
+                    models.IntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID do Produto"
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        help_text="Dados do produto em formato JSON",
+                        verbose_name="Dados do Produto",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(max_length=64, verbose_name="Hash do Conteúdo"),
+                ),
+                (
+                    "synced_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Sincronizado em"),
+                ),
+            ],
+            options={
+                "verbose_name": "Produto",
+                "verbose_name_plural": "Produtos",
+                "ordering": ("id",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="favorites",
+            index=models.Index(
+                fields=["customer", "active"], name="idx_customer_active"
+            ),
+        ),
+    ]
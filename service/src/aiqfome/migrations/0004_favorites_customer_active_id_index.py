@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0003_product"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="favorites",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["customer", "-id"],
+                name="idx_customer_active_id",
+            ),
+        ),
+    ]
@@ -0,0 +1,152 @@
+# Generated by Django 5.2 on 2026-10-18 15:27
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def content_hash(data):
+    """Cópia congelada de `utils.hashing.content_hash`, da época desta migração.
+
+    A migração não importa código da aplicação: os hashes gravados aqui são as
+    chaves primárias dos snapshots e não podem mudar se o módulo mudar depois.
+    """
+    payload = json.dumps(
+        data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link_batch(ProductSnapshot, model, rows):
+    snapshots = {}
+    for row in rows:
+        row.snapshot_id = content_hash(row.product_data)
+        snapshots[row.snapshot_id] = ProductSnapshot(
+            content_hash=row.snapshot_id, data=row.product_data
+        )
+    ProductSnapshot.objects.bulk_create(snapshots.values(), ignore_conflicts=True)
+    model.objects.bulk_update(rows, ["snapshot"])
+
+
+def link_snapshots(apps, schema_editor):
+    """Move o `product_data` de favoritos e do histórico para `ProductSnapshot`."""
+    ProductSnapshot = apps.get_model("aiqfome", "ProductSnapshot")
+    for model_name in ("Favorites", "HistoricalFavorites"):
+        model = apps.get_model("aiqfome", model_name)
+        rows = model.objects.filter(snapshot__isnull=True).exclude(
+            product_data__isnull=True
+        )
+
+        batch = []
+        for row in rows.only("product_data").iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                _link_batch(ProductSnapshot, model, batch)
+                batch = []
+        if batch:
+            _link_batch(ProductSnapshot, model, batch)
+
+
+def restore_product_data(apps, schema_editor):
+    """Copia os dados do snapshot de volta para `product_data`."""
+    for model_name in ("Favorites", "HistoricalFavorites"):
+        model = apps.get_model("aiqfome", model_name)
+        rows = model.objects.filter(snapshot__isnull=False).select_related("snapshot")
+
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            row.product_data = row.snapshot.data
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_update(batch, ["product_data"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["product_data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0004_favorites_customer_active_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSnapshot",
+            fields=[
+                (
+                    "content_hash",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Hash do Conteúdo",
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        help_text="Dados do produto em formato JSON",
+                        verbose_name="Dados do Produto",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+            ],
+            options={
+                "verbose_name": "Snapshot de Produto",
+                "verbose_name_plural": "Snapshots de Produtos",
+            },
+        ),
+        migrations.AlterField(
+            model_name="favorites",
+            name="product_data",
+            field=models.JSONField(
+                help_text="Dados do produto favorito em formato JSON",
+                null=True,
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalfavorites",
+            name="product_data",
+            field=models.JSONField(
+                help_text="Dados do produto favorito em formato JSON",
+                null=True,
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.AddField(
+            model_name="favorites",
+            name="snapshot",
+            field=models.ForeignKey(
+                help_text="Snapshot dos dados do produto favorito",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="favorites",
+                to="aiqfome.productsnapshot",
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalfavorites",
+            name="snapshot",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                help_text="Snapshot dos dados do produto favorito",
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="aiqfome.productsnapshot",
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.RunPython(link_snapshots, restore_product_data),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 15:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0005_productsnapshot"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="favorites",
+            name="product_data",
+        ),
+        migrations.RemoveField(
+            model_name="historicalfavorites",
+            name="product_data",
+        ),
+        migrations.AlterField(
+            model_name="favorites",
+            name="snapshot",
+            field=models.ForeignKey(
+                help_text="Snapshot dos dados do produto favorito",
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="favorites",
+                to="aiqfome.productsnapshot",
+                verbose_name="Dados do Produto",
+            ),
+        ),
+    ]
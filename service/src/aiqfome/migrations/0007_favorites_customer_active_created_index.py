@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 15:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0006_remove_favorites_product_data"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="favorites",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["customer", "-created_at"],
+                include=("id", "product_id", "snapshot", "updated_at"),
+                name="idx_customer_active_created",
+            ),
+        ),
+    ]
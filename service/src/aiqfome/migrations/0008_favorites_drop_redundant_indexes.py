@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 16:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0007_favorites_customer_active_created_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="favorites",
+            name="idx_customer_active",
+        ),
+        migrations.RemoveIndex(
+            model_name="favorites",
+            name="idx_customer_active_created",
+        ),
+        migrations.AddIndex(
+            model_name="favorites",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["customer", "-created_at"],
+                name="idx_customer_active_created",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import aiqfome.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aiqfome", "0008_favorites_drop_redundant_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="favorites",
+            name="snapshot",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="Snapshot dos dados do produto favorito",
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="favorites",
+                to="aiqfome.productsnapshot",
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalfavorites",
+            name="snapshot",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                db_index=False,
+                help_text="Snapshot dos dados do produto favorito",
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="aiqfome.productsnapshot",
+                verbose_name="Dados do Produto",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productsnapshot",
+            name="content_hash",
+            field=aiqfome.models.fields.ContentHashField(
+                max_length=64,
+                primary_key=True,
+                serialize=False,
+                verbose_name="Hash do Conteúdo",
+            ),
+        ),
+    ]
@@ -3,11 +3,12 @@ import uuid
 from django.db import models
 from simple_history.models import HistoricalRecords
 
+from aiqfome.models.ProductSnapshot import ProductSnapshot
 from authentication.models import Customer
 
 
 class Favorites(models.Model):
-    history = HistoricalRecords()
+    history = HistoricalRecords(no_db_index=["snapshot"])
 
     id = models.UUIDField(
         "ID do Favorito", primary_key=True, default=uuid.uuid7, editable=False
@@ -21,9 +22,15 @@ class Favorites(models.Model):
     )
     product_id = models.IntegerField(verbose_name="ID do Produto")
 
-    product_data = models.JSONField(
+    # sem índice (nem no histórico, ver `no_db_index`): nenhuma consulta filtra por
+    # snapshot; a FK só é usada pelo PROTECT, e snapshots não são apagados
+    snapshot = models.ForeignKey(
+        ProductSnapshot,
+        on_delete=models.PROTECT,
+        related_name="favorites",
+        db_index=False,
         verbose_name="Dados do Produto",
-        help_text="Dados do produto favorito em formato JSON",
+        help_text="Snapshot dos dados do produto favorito",
     )
 
     active = models.BooleanField(default=True, verbose_name="Ativo")
@@ -31,6 +38,11 @@ class Favorites(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
+    @property
+    def product_data(self):
+        """Dados do produto favorito (ver `ProductSnapshot`)."""
+        return self.snapshot.data
+
     def __str__(self):
         return f'Favorito: {self.product_data.get("title")} por {self.customer}'
 
@@ -39,5 +51,14 @@ class Favorites(models.Model):
         verbose_name_plural = "Produtos Favoritos"
         unique_together = ("customer", "product_id")
         indexes = [
-            models.Index(fields=["customer", "active"], name="idx_customer_active")
+            models.Index(
+                fields=["customer", "-id"],
+                name="idx_customer_active_id",
+                condition=models.Q(active=True),
+            ),
+            models.Index(
+                fields=["customer", "-created_at"],
+                name="idx_customer_active_created",
+                condition=models.Q(active=True),
+            ),
         ]
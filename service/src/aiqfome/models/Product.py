@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class Product(models.Model):
+    """Espelho local do catálogo da FakeStore API.
+
+    Populado pelo comando `sync_products`, que grava apenas as linhas cujo
+    `content_hash` mudou. Quando `PRODUCT_CATALOG_SOURCE = "database"`, o proxy de
+    produtos e a criação de favoritos leem desta tabela em vez da API externa.
+
+    Atributos:
+        - id (int): ID do produto na FakeStore API.
+        - data (dict): Dados do produto em formato JSON, como retornados pela API.
+        - content_hash (str): Hash SHA-256 de `data`, usado na sincronização incremental.
+        - synced_at (datetime): Data e hora da última alteração sincronizada.
+    """
+
+    id = models.IntegerField("ID do Produto", primary_key=True)
+
+    data = models.JSONField(
+        verbose_name="Dados do Produto",
+        help_text="Dados do produto em formato JSON",
+    )
+    content_hash = models.CharField("Hash do Conteúdo", max_length=64)
+
+    synced_at = models.DateTimeField(auto_now=True, verbose_name="Sincronizado em")
+
+    def __str__(self):
+        return f'Produto {self.id}: {self.data.get("title")}'
+
+    class Meta:
+        verbose_name = "Produto"
+        verbose_name_plural = "Produtos"
+        ordering = ("id",)
@@ -0,0 +1,61 @@
+from django.db import models
+
+from aiqfome.models.fields import ContentHashField
+from utils.hashing import content_hash
+
+
+class ProductSnapshot(models.Model):
+    """Cópia imutável dos dados de um produto, endereçada pelo hash do conteúdo.
+
+    Favoritos (e o histórico deles) referenciam o snapshot em vez de guardar o
+    JSON do produto em cada linha; favoritos de um mesmo produto com os mesmos
+    dados compartilham uma única linha.
+
+    Atributos:
+        - content_hash (str): Hash SHA-256 de `data` (ver `utils.hashing.content_hash`).
+        - data (dict): Dados do produto em formato JSON.
+        - created_at (datetime): Data e hora de criação do snapshot.
+    """
+
+    content_hash = ContentHashField("Hash do Conteúdo", max_length=64, primary_key=True)
+
+    data = models.JSONField(
+        verbose_name="Dados do Produto",
+        help_text="Dados do produto em formato JSON",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    def __str__(self):
+        return f'Snapshot {self.content_hash[:12]}: {self.data.get("title")}'
+
+    @classmethod
+    def for_data(cls, data):
+        """Retorna o snapshot dos dados, gravando-o se ainda não existir.
+
+        Args:
+            data (dict): dados do produto.
+
+        Returns:
+            ProductSnapshot: snapshot dos dados.
+        """
+        return cls.for_many([data])[0]
+
+    @classmethod
+    def for_many(cls, items):
+        """Versão em lote de `for_data`, com um único INSERT para os snapshots novos.
+
+        Args:
+            items (list): dados de cada produto.
+
+        Returns:
+            list: snapshots, na mesma ordem de `items`.
+        """
+        snapshots = [cls(content_hash=content_hash(data), data=data) for data in items]
+        unique = {snapshot.content_hash: snapshot for snapshot in snapshots}
+        cls.objects.bulk_create(unique.values(), ignore_conflicts=True)
+        return snapshots
+
+    class Meta:
+        verbose_name = "Snapshot de Produto"
+        verbose_name_plural = "Snapshots de Produtos"
@@ -1 +1,3 @@
 from aiqfome.models.Favorites import Favorites  # noqa: F401
+from aiqfome.models.Product import Product  # noqa: F401
+from aiqfome.models.ProductSnapshot import ProductSnapshot  # noqa: F401
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class ContentHashField(models.CharField):
+    """Hash hexadecimal de tamanho fixo.
+
+    No Postgres é gravado como `char(n)` em vez de `varchar(n)`: como chave
+    primária, `varchar` ganharia um segundo índice `_like` (`varchar_pattern_ops`),
+    e o hash nunca é buscado por prefixo.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return f"char({self.max_length})"
+        return super().db_type(connection)
@@ -1,9 +1,12 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from rest_framework.exceptions import NotFound
-from rest_framework.test import APIRequestFactory
+from simple_history.utils import bulk_update_with_history
 
-from aiqfome.models import Favorites
-from utils.FakeStoreProxyViewSet import FakeStoreProxyViewSet
+from aiqfome.models import Favorites, ProductSnapshot
+from utils import product_service
+from utils.fakestore_client import UpstreamError
 
 
 class FavoritesSerializer(serializers.ModelSerializer):
@@ -15,13 +18,14 @@ class FavoritesSerializer(serializers.ModelSerializer):
     - id: Identificador único do favorito.
     - customer: Cliente associado ao favorito.
     - product_id: Produto associado ao favorito.
-    - product_data: Dados do produto em formato JSON.
+    - product_data: Dados do produto em formato JSON (do `ProductSnapshot`).
     - active: Indica se o favorito está ativo.
     - created_at: Data e hora de criação do favorito.
     - updated_at: Data e hora da última atualização do favorito.
     """
 
     product_id = serializers.IntegerField()
+    product_data = serializers.JSONField(source="snapshot.data", read_only=True)
 
     class Meta:
         model = Favorites
@@ -48,28 +52,179 @@ class FavoritesSerializer(serializers.ModelSerializer):
         user = request.user
         product_id = validated_data["product_id"]
 
-        factory = APIRequestFactory()
-        fake_get_request = factory.get(f"/products/{product_id}/")
+        try:
+            product_data = dict(product_service.get_product(product_id).data)
+        except UpstreamError:
+            raise product_service.ProductUnavailable()
 
-        view = FakeStoreProxyViewSet.as_view({"get": "retrieve"})
-        response = view(fake_get_request, pk=product_id)
-
-        if response.status_code != 200:
-            raise NotFound("Produto não encontrado.")
-
-        product_data = response.data
         product_data.pop("id", None)
+        snapshot = ProductSnapshot.for_data(product_data)
         favorite, create = Favorites.objects.get_or_create(
             customer=user,
             product_id=product_id,
-            defaults={"product_data": product_data, "active": True},
+            defaults={"snapshot": snapshot, "active": True},
         )
         if favorite and favorite.active and not create:
             raise serializers.ValidationError("Produto já está nos favoritos.")
 
         if not create:
             favorite.active = True
-            favorite.product_data = product_data
-            favorite.save()
+            favorite.snapshot = snapshot
+            favorite.save(update_fields=["active", "snapshot", "updated_at"])
 
         return favorite
+
+
+class FavoritesBulkCreateSerializer(serializers.Serializer):
+    """Serializer para adicionar vários produtos aos favoritos de uma vez.
+
+    Campos:
+    - product_ids: IDs dos produtos (repetidos são ignorados).
+
+    `save()` retorna o resultado de cada produto, na ordem pedida, com `status`
+    igual a `created`, `reactivated`, `already_favorited`, `not_found` ou
+    `unavailable`.
+    """
+
+    product_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.PROXY_BATCH_MAX_IDS,
+    )
+
+    def validate_product_ids(self, value):
+        return list(dict.fromkeys(value))
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        product_ids = validated_data["product_ids"]
+
+        products = product_service.get_products(product_ids)
+        statuses = {pk: "not_found" for pk in products.not_found}
+        statuses.update({pk: "unavailable" for pk in products.unavailable})
+
+        product_data = {}
+        for pk, product in products.found.items():
+            product_data[pk] = dict(product.data)
+            product_data[pk].pop("id", None)
+        snapshots = dict(
+            zip(product_data, ProductSnapshot.for_many(list(product_data.values())))
+        )
+
+        existing = {
+            favorite.product_id: favorite
+            for favorite in Favorites.objects.filter(
+                customer=user, product_id__in=product_data
+            )
+        }
+
+        to_create = []
+        to_reactivate = []
+        for pk, snapshot in snapshots.items():
+            favorite = existing.get(pk)
+            if favorite is None:
+                to_create.append(
+                    Favorites(
+                        customer=user, product_id=pk, snapshot=snapshot, active=True
+                    )
+                )
+            elif favorite.active:
+                statuses[pk] = "already_favorited"
+            else:
+                favorite.active = True
+                favorite.snapshot = snapshot
+                favorite.updated_at = timezone.now()
+                to_reactivate.append(favorite)
+
+        favorites = {}
+        with transaction.atomic():
+            if to_create:
+                # Conflitos (favorito criado por outra requisição no meio tempo) são
+                # ignorados; o ID gerado na aplicação indica quais linhas entraram
+                Favorites.objects.bulk_create(to_create, ignore_conflicts=True)
+                inserted = set(
+                    Favorites.objects.filter(
+                        pk__in=[favorite.pk for favorite in to_create]
+                    ).values_list("pk", flat=True)
+                )
+                created = [
+                    favorite for favorite in to_create if favorite.pk in inserted
+                ]
+                Favorites.history.bulk_history_create(created, default_user=user)
+                for favorite in to_create:
+                    statuses[favorite.product_id] = (
+                        "created" if favorite.pk in inserted else "already_favorited"
+                    )
+                favorites.update(
+                    {favorite.product_id: favorite for favorite in created}
+                )
+
+            if to_reactivate:
+                bulk_update_with_history(
+                    to_reactivate,
+                    Favorites,
+                    ["active", "snapshot", "updated_at"],
+                    default_user=user,
+                )
+                for favorite in to_reactivate:
+                    statuses[favorite.product_id] = "reactivated"
+                    favorites[favorite.product_id] = favorite
+
+        results = []
+        for pk in product_ids:
+            result = {"product_id": pk, "status": statuses[pk]}
+            if pk in favorites:
+                result["favorite"] = FavoritesSerializer(favorites[pk]).data
+            results.append(result)
+        return results
+
+
+class FavoritesBulkDeactivateSerializer(serializers.Serializer):
+    """Serializer para desativar vários favoritos do cliente de uma vez.
+
+    Campos:
+    - ids: IDs dos favoritos a desativar.
+    - all: Desativa todos os favoritos ativos do cliente (no lugar de `ids`).
+
+    `save()` retorna os IDs desativados e os que não foram encontrados entre os
+    favoritos ativos do cliente.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False
+    )
+    all = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if attrs["all"] == ("ids" in attrs):
+            raise serializers.ValidationError(
+                "Informe `ids` ou `all`, apenas um deles."
+            )
+        return attrs
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        ids = list(dict.fromkeys(validated_data.get("ids", [])))
+
+        with transaction.atomic():
+            queryset = Favorites.objects.filter(customer=user, active=True)
+            if not validated_data["all"]:
+                queryset = queryset.filter(pk__in=ids)
+            favorites = list(queryset.select_for_update())
+
+            now = timezone.now()
+            Favorites.objects.filter(
+                pk__in=[favorite.pk for favorite in favorites]
+            ).update(active=False, updated_at=now)
+            for favorite in favorites:
+                favorite.active = False
+                favorite.updated_at = now
+            Favorites.history.bulk_history_create(
+                favorites, update=True, default_user=user, default_date=now
+            )
+
+        deactivated = {favorite.pk for favorite in favorites}
+        return {
+            "deactivated": [favorite.pk for favorite in favorites],
+            "not_found": [pk for pk in ids if pk not in deactivated],
+        }
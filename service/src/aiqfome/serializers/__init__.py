@@ -1 +1,5 @@
-from aiqfome.serializers.FavoritesSerializer import FavoritesSerializer  # noqa: F401
+from aiqfome.serializers.FavoritesSerializer import (  # noqa: F401
+    FavoritesBulkCreateSerializer,
+    FavoritesBulkDeactivateSerializer,
+    FavoritesSerializer,
+)
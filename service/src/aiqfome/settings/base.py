@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -30,6 +31,7 @@ OTHER_APPS = [
 INSTALLED_APPS = DEFAULT_APPS + LOCAL_APPS + OTHER_APPS
 
 MIDDLEWARE = [
+    "utils.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -124,11 +126,92 @@ DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 LOGIN_URL = "/admin/login/"
 
+# Cache em dois níveis: um LRU pequeno por worker (L1) na frente do cache
+# compartilhado entre os workers (L2, alias "shared"). Sem `REDIS_URL` (ver
+# settings/env.py) o L2 é um cache em arquivo, compartilhado entre os processos
+# da mesma máquina.
+CACHE_L1_MAX_ENTRIES = 1000
+CACHE_L1_TIMEOUT = 5
+CACHE_SHARED_TIMEOUT = 60 * 30
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-fakestore-cache",
-    }
+        "BACKEND": "utils.cache_backends.TwoTierCache",
+        "LOCATION": "aiqfome-l1",
+        "OPTIONS": {
+            "SHARED_ALIAS": "shared",
+            "L1_MAX_ENTRIES": CACHE_L1_MAX_ENTRIES,
+            "L1_TIMEOUT": CACHE_L1_TIMEOUT,
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "aiqfome-cache"),
+        "TIMEOUT": CACHE_SHARED_TIMEOUT,
+    },
 }
 
+# Alias usado para locks e estado do circuit breaker, que precisam ser vistos na
+# hora por todos os workers e por isso não passam pelo L1
+COORDINATION_CACHE_ALIAS = "shared"
+
+# Métricas (/metrics): cada worker (hostname:pid) publica seus valores no cache
+# compartilhado a cada `METRICS_FLUSH_INTERVAL` segundos; snapshots e o registro
+# de workers parados expiram após `METRICS_RETENTION` segundos. O endpoint exige
+# um usuário staff, a menos que `METRICS_PUBLIC` esteja ligado
+METRICS_FLUSH_INTERVAL = 5
+METRICS_RETENTION = 60 * 60 * 24
+METRICS_PUBLIC = False
+
 CACHE_TIMEOUT = 60 * 5
+
+# Lista de favoritos por usuário: a chave é versionada no cache compartilhado e
+# invalidada em todos os workers a cada escrita, por isso o TTL pode ser longo.
+# Listas maiores que `FAVORITES_CACHE_MAX_ITEMS` são lidas direto do banco, já que
+# cada escrita regrava o índice inteiro da lista
+FAVORITES_CACHE_TIMEOUT = 60 * 60 * 24
+FAVORITES_CACHE_MAX_ITEMS = 500
+
+# Paginação por cursor da lista de favoritos (`?cursor=` / `?page_size=`); com
+# `FAVORITES_PAGE_CACHE` cada página também fica em cache, na versão do usuário
+FAVORITES_PAGE_SIZE = 50
+FAVORITES_MAX_PAGE_SIZE = 200
+FAVORITES_PAGE_CACHE = False
+
+# Cache do proxy da FakeStore (stale-while-revalidate, em segundos)
+PROXY_CACHE_STALE_WHILE_REVALIDATE = True
+PROXY_CACHE_SOFT_TIMEOUT = CACHE_TIMEOUT
+PROXY_CACHE_HARD_TIMEOUT = 60 * 30
+PROXY_CACHE_NEGATIVE_TIMEOUT = 60
+PROXY_CACHE_LAST_GOOD_TIMEOUT = 60 * 60 * 24
+
+# Guarda o corpo JSON já renderizado (e gzip acima do tamanho mínimo, em bytes)
+PROXY_CACHE_RENDERED = True
+PROXY_CACHE_GZIP = True
+PROXY_CACHE_GZIP_MIN_LENGTH = 1024
+
+# Busca de produtos em lote (/api/products/batch); `PROXY_BATCH_MAX_WORKERS` é o
+# total de buscas simultâneas por processo, limitado a `FAKESTORE_POOL_MAXSIZE`
+PROXY_BATCH_MAX_IDS = 50
+PROXY_BATCH_MAX_WORKERS = 8
+
+# Fonte primária do catálogo: "upstream" (FakeStore API) ou "database" (tabela
+# `Product`, sincronizada com `python manage.py sync_products`)
+PRODUCT_CATALOG_SOURCE = "upstream"
+
+# Cliente HTTP da FakeStore API (timeouts em segundos)
+FAKESTORE_CONNECT_TIMEOUT = 3.05
+FAKESTORE_READ_TIMEOUT = 10
+FAKESTORE_MAX_RETRIES = 2
+FAKESTORE_RETRY_BACKOFF = 0.3
+FAKESTORE_POOL_MAXSIZE = 10
+FAKESTORE_ASYNC_MAX_CONNECTIONS = 100
+# O circuito abre após `FAKESTORE_CIRCUIT_FAILURE_THRESHOLD` falhas (seguidas ou
+# não) em `FAKESTORE_CIRCUIT_FAILURE_WINDOW` segundos
+FAKESTORE_CIRCUIT_FAILURE_THRESHOLD = 5
+FAKESTORE_CIRCUIT_FAILURE_WINDOW = 30
+FAKESTORE_CIRCUIT_RECOVERY_TIMEOUT = 30
+
+# Coalescência de misses no cache do proxy (lock entre workers, em segundos)
+PROXY_LOCK_TIMEOUT = 15
+PROXY_LOCK_POLL_INTERVAL = 0.05
@@ -10,6 +10,7 @@ load_dotenv(override=True)
 
 DEBUG = os.getenv("DEBUG").lower() == "true"
 PRODUCTION = os.getenv("PRODUCTION", "False").lower() == "true"
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "False").lower() == "true"
 
 POSTGRES_DB = "aiqfome_db"
 POSTGRES_USER = os.getenv("POSTGRES_USER")
@@ -45,3 +46,10 @@ DATABASES = {
 }
 
 FAKESTORE_BASE_URL = "https://fakestoreapi.com/products"
+
+if os.getenv("REDIS_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+        "TIMEOUT": CACHE_SHARED_TIMEOUT,
+    }
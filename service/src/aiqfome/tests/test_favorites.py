@@ -1,7 +1,33 @@
+import io
+import uuid
+from unittest import mock
+
 import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
+from aiqfome.models import Favorites, ProductSnapshot
+from authentication.models import Customer
 from authentication.tests.test_authentication import _make_login
+from utils import fakestore_client, proxy_cache
+from utils.cache_utils import (
+    active_favorites,
+    bump_favorites_cache_version,
+    favorites_cache_key,
+    get_favorites_cache_version,
+    get_favorites_for_user,
+)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
 
 
 def _make_favorite(user_token, product_id):
@@ -146,3 +172,388 @@ def test_deactivate_favorite():
 
     get_response = client.get(f"/api/favorites/{favorite_id}")
     assert get_response.status_code == 404, get_response.content
+
+
+@pytest.mark.django_db
+def test_favorites_cache_is_invalidated_by_version_bump():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    favorite_response = _make_favorite(user_token, 1)
+    favorite = Favorites.objects.get(pk=favorite_response.json().get("id"))
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+    assert len(client.get("/api/favorites").json()) == 1
+
+    Favorites.objects.create(
+        customer=favorite.customer,
+        product_id=2,
+        snapshot=ProductSnapshot.for_data({"id": 2}),
+    )
+    assert len(client.get("/api/favorites").json()) == 1
+
+    bump_favorites_cache_version(favorite.customer_id)
+
+    favorites = client.get("/api/favorites").json()
+    assert [item["product_id"] for item in favorites] == [2, 1]
+
+
+@pytest.mark.django_db
+def test_add_favorite_uses_cached_product():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+    proxy_cache.store_many({"fakestore:product:7": {"id": 7, "title": "Mochila"}})
+
+    with mock.patch.object(fakestore_client, "get") as upstream:
+        response = _make_favorite(user_token, 7)
+
+    assert response.status_code == 201, response.content
+    assert response.json()["product_data"] == {"title": "Mochila"}
+    upstream.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_add_favorite_upstream_unavailable():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    with mock.patch.object(
+        fakestore_client, "get", side_effect=fakestore_client.UpstreamError("down")
+    ):
+        response = _make_favorite(user_token, 7)
+
+    assert response.status_code == 502, response.content
+    assert response.json().get("detail") == "Erro ao acessar API externa."
+
+
+@pytest.mark.django_db
+def test_bulk_add_favorites(django_capture_on_commit_callbacks):
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    _make_favorite(user_token, 1)
+    inactive = Favorites.objects.get(pk=_make_favorite(user_token, 2).json()["id"])
+    inactive.active = False
+    inactive.save()
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+
+    with mock.patch(
+        "aiqfome.api.FavoritesRestView.update_favorites_cache_for_user"
+    ) as update_cache:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                "/api/favorites/bulk",
+                {"product_ids": [1, 2, 3, 3, 9999]},
+                format="json",
+            )
+
+    assert response.status_code == 200, response.content
+    results = response.json()["results"]
+    assert [(item["product_id"], item["status"]) for item in results] == [
+        (1, "already_favorited"),
+        (2, "reactivated"),
+        (3, "created"),
+        (9999, "not_found"),
+    ]
+    assert results[2]["favorite"]["product_id"] == 3
+    assert Favorites.objects.get(pk=inactive.pk).active is True
+    assert Favorites.history.filter(product_id=3).count() == 1
+    assert Favorites.history.filter(product_id=2).count() == 3
+    update_cache.assert_called_once_with(inactive.customer_id)
+
+
+@pytest.mark.django_db
+def test_bulk_add_favorites_requires_product_ids():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+
+    response = client.post("/api/favorites/bulk", {"product_ids": []}, format="json")
+
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+def test_bulk_deactivate_favorites(django_capture_on_commit_callbacks):
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    first_id = _make_favorite(user_token, 1).json()["id"]
+    second_id = _make_favorite(user_token, 2).json()["id"]
+    third_id = _make_favorite(user_token, 3).json()["id"]
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+
+    with mock.patch(
+        "aiqfome.api.FavoritesRestView.update_favorites_cache_for_user"
+    ) as update_cache:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                "/api/favorites/bulk-deactivate",
+                {"ids": [first_id, second_id, str(uuid.uuid4())]},
+                format="json",
+            )
+
+    assert response.status_code == 200, response.content
+    assert sorted(response.json()["deactivated"]) == sorted([first_id, second_id])
+    assert len(response.json()["not_found"]) == 1
+    assert list(Favorites.objects.filter(active=True).values_list("pk", flat=True)) == [
+        uuid.UUID(third_id)
+    ]
+    assert Favorites.history.filter(history_type="~", active=False).count() == 2
+    update_cache.assert_called_once()
+
+    response = client.post(
+        "/api/favorites/bulk-deactivate", {"all": True}, format="json"
+    )
+
+    assert response.json()["deactivated"] == [third_id]
+    assert client.get("/api/favorites").json() == []
+
+
+@pytest.mark.django_db
+def test_bulk_deactivate_favorites_requires_ids_or_all():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+
+    response = client.post("/api/favorites/bulk-deactivate", {}, format="json")
+
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+def test_get_favorites_cursor_pagination():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+    for product_id in range(1, 6):
+        _make_favorite(user_token, product_id)
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+
+    pages = []
+    url = "/api/favorites?page_size=2"
+    with CaptureQueriesContext(connection) as queries:
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200, response.content
+            pages.append([item["product_id"] for item in response.json()["results"]])
+            url = response.json()["next"]
+
+    assert pages == [[5, 4], [3, 2], [1]]
+    favorites_queries = [
+        query["sql"] for query in queries if 'FROM "aiqfome_favorites"' in query["sql"]
+    ]
+    assert all("OFFSET" not in sql for sql in favorites_queries)
+    assert sum('"aiqfome_favorites"."id" <' in sql for sql in favorites_queries) == 2
+
+
+@pytest.mark.django_db
+@override_settings(FAVORITES_PAGE_CACHE=True)
+def test_get_favorites_page_is_cached_until_next_write():
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+    favorite = Favorites.objects.get(pk=_make_favorite(user_token, 1).json()["id"])
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+    assert len(client.get("/api/favorites?page_size=10").json()["results"]) == 1
+
+    Favorites.objects.create(
+        customer=favorite.customer,
+        product_id=2,
+        snapshot=ProductSnapshot.for_data({"id": 2}),
+    )
+    assert len(client.get("/api/favorites?page_size=10").json()["results"]) == 1
+
+    bump_favorites_cache_version(favorite.customer_id)
+    assert len(client.get("/api/favorites?page_size=10").json()["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_favorites_cache_is_patched_on_create_and_destroy(
+    django_capture_on_commit_callbacks,
+):
+    login_response = _make_login()
+    user_token = login_response.json().get("access")
+    first_id = _make_favorite(user_token, 1).json()["id"]
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+    assert len(client.get("/api/favorites").json()) == 1
+
+    with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+        with django_capture_on_commit_callbacks(execute=True):
+            second_id = _make_favorite(user_token, 2).json()["id"]
+    written = [
+        call.args[0]
+        for call in cache_set.call_args_list
+        if call.args[0].startswith("fakestore:all_products:")
+    ]
+    assert len(written) == 2
+    assert f":item:{second_id}:" in written[0]
+
+    with CaptureQueriesContext(connection) as queries:
+        favorites = client.get("/api/favorites").json()
+    assert [item["id"] for item in favorites] == [second_id, first_id]
+    assert not [query for query in queries if "aiqfome_favorites" in query["sql"]]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.delete(f"/api/favorites/{second_id}")
+
+    with CaptureQueriesContext(connection) as queries:
+        favorites = client.get("/api/favorites").json()
+    assert [item["id"] for item in favorites] == [first_id]
+    assert not [query for query in queries if "aiqfome_favorites" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_favorites_cache_rebuild_does_not_outlive_a_concurrent_write():
+    user_token = _make_login().json().get("access")
+    _make_favorite(user_token, 1)
+    customer = Favorites.objects.get().customer
+
+    def query_then_concurrent_write(user_id):
+        favorites = list(active_favorites(user_id))
+        bump_favorites_cache_version(user_id)
+        return favorites
+
+    with mock.patch(
+        "utils.cache_utils.active_favorites", side_effect=query_then_concurrent_write
+    ):
+        assert len(get_favorites_for_user(customer.id)) == 1
+
+    assert cache.get(favorites_cache_key(customer.id)) is None
+
+
+@pytest.mark.django_db
+@override_settings(FAVORITES_CACHE_MAX_ITEMS=1)
+def test_favorites_cache_skips_lists_above_the_cap(django_capture_on_commit_callbacks):
+    user_token = _make_login().json().get("access")
+    _make_favorite(user_token, 1)
+    customer = Favorites.objects.get().customer
+
+    assert len(get_favorites_for_user(customer.id)) == 1
+    assert cache.get(favorites_cache_key(customer.id)) is not None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        _make_favorite(user_token, 2)
+    assert cache.get(favorites_cache_key(customer.id)) is None
+
+    assert len(get_favorites_for_user(customer.id)) == 2
+    assert cache.get(favorites_cache_key(customer.id)) is None
+
+
+@pytest.mark.django_db
+def test_favorites_share_product_snapshots():
+    user_token = _make_login().json().get("access")
+    _make_favorite(user_token, 1)
+
+    other = Customer.objects.create(
+        username="outro_usuario",
+        email="outro@example.com",
+        first_name="Outro",
+        last_name="Usuário",
+    )
+    client = APIClient()
+    client.force_authenticate(other)
+    response = client.post("/api/favorites", {"product_id": 1}, format="json")
+
+    assert response.status_code == 201, response.content
+    assert ProductSnapshot.objects.count() == 1
+    assert (
+        Favorites.objects.filter(product_id=1).values("snapshot").distinct().count()
+        == 1
+    )
+    assert response.json()["product_data"] == ProductSnapshot.objects.get().data
+
+
+@pytest.mark.django_db
+def test_get_favorites_sparse_fieldsets():
+    user_token = _make_login().json().get("access")
+    favorite_id = _make_favorite(user_token, 1).json()["id"]
+    _make_favorite(user_token, 2)
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {user_token}")
+    fields = "product_id,product_data.title,product_data.price"
+
+    with CaptureQueriesContext(connection) as queries:
+        favorites = client.get("/api/favorites", {"fields": fields}).json()
+    assert [set(item) for item in favorites] == [{"product_id", "product_data"}] * 2
+    assert all(set(item["product_data"]) == {"title", "price"} for item in favorites)
+    assert [query for query in queries if "aiqfome_favorites" in query["sql"]]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get("/api/favorites", {"fields": fields}).json() == favorites
+    assert not [query for query in queries if "aiqfome_favorites" in query["sql"]]
+
+    page = client.get("/api/favorites", {"page_size": 1, "exclude": "product_data"})
+    assert "product_data" not in page.json()["results"][0]
+
+    response = client.get(f"/api/favorites/{favorite_id}", {"fields": "id,active"})
+    assert response.json() == {"id": favorite_id, "active": True}
+
+
+@pytest.mark.django_db
+def test_refresh_favorite_snapshots_updates_only_changed_products():
+    user_token = _make_login().json().get("access")
+    for product_id in (1, 2, 3):
+        _make_favorite(user_token, product_id)
+    customer = Favorites.objects.first().customer
+    current = Favorites.objects.get(product_id=2).snapshot_id
+    Favorites.objects.filter(product_id__in=[1, 3]).update(
+        snapshot=ProductSnapshot.for_data({"title": "Antigo", "price": 1.0})
+    )
+    version = get_favorites_cache_version(customer.id)
+
+    call_command("refresh_favorite_snapshots", chunk_size=2, stdout=io.StringIO())
+
+    assert len(set(Favorites.objects.values_list("snapshot", flat=True))) == 3
+    assert Favorites.objects.get(product_id=2).snapshot_id == current
+    assert all(
+        favorite.product_data["title"] != "Antigo"
+        for favorite in Favorites.objects.select_related("snapshot")
+    )
+    assert Favorites.history.filter(history_type="~").count() == 2
+    assert get_favorites_cache_version(customer.id) != version
+
+
+@pytest.mark.django_db
+def test_refresh_favorite_snapshots_aborts_on_fallback_catalog():
+    call_command("refresh_favorite_snapshots", stdout=io.StringIO())
+
+    with mock.patch.object(
+        fakestore_client, "get", side_effect=fakestore_client.UpstreamError("down")
+    ):
+        with pytest.raises(CommandError, match="indisponível"):
+            call_command("refresh_favorite_snapshots", stdout=io.StringIO())
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="EXPLAIN específico do Postgres"
+)
+def test_active_favorites_query_uses_ordered_partial_index():
+    user_token = _make_login().json().get("access")
+    for product_id in range(1, 6):
+        _make_favorite(user_token, product_id)
+    customer = Favorites.objects.first().customer
+    Favorites.objects.filter(product_id=5).update(active=False)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("ANALYZE aiqfome_favorites")
+    plan = active_favorites(customer.id).explain()
+
+    assert "idx_customer_active_created" in plan
+    assert "Sort" not in plan
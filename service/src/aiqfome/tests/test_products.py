@@ -0,0 +1,635 @@
+import asyncio
+import gzip
+import io
+import json
+import threading
+import time
+import uuid
+from unittest import mock
+
+import pytest
+import requests
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import Client, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from aiqfome.models import Product
+from authentication.models import Customer
+from utils import (
+    catalog_index,
+    fakestore_client,
+    fieldsets,
+    metrics,
+    product_service,
+    proxy_cache,
+)
+from utils.cache_backends import TwoTierCache
+from utils.circuit_breaker import CircuitState
+from utils.hashing import content_hash
+
+
+def _make_upstream_response(payload, status_code=200):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.content = b"" if payload is None else b"{}"
+    response.json.return_value = payload
+    return response
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(fakestore_client, "_session", None)
+    yield
+    if fakestore_client._session is not None:
+        fakestore_client._session.close()
+
+
+def test_fakestore_session_is_shared_and_pooled(fresh_session):
+    session = fakestore_client.get_session()
+    adapter = session.get_adapter("https://fakestoreapi.com/products")
+
+    assert fakestore_client.get_session() is session
+    assert adapter.max_retries.total > 0
+    assert adapter.max_retries.backoff_factor > 0
+    assert adapter.max_retries.read == 0
+
+
+@pytest.mark.django_db
+def test_retrieve_product_upstream_timeout_returns_502():
+    with mock.patch.object(
+        fakestore_client.get_session(),
+        "get",
+        side_effect=requests.ConnectTimeout("timeout"),
+    ):
+        response = APIClient().get("/api/products/1")
+
+    assert response.status_code == 502, response.content
+
+
+@pytest.mark.django_db
+def test_retrieve_product_empty_upstream_error_is_not_cached_as_not_found():
+    upstream = _make_upstream_response(None, status_code=503)
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream) as get:
+        first = APIClient().get("/api/products/1")
+        second = APIClient().get("/api/products/1")
+
+    assert first.status_code == 502, first.content
+    assert second.status_code == 502, second.content
+    assert get.call_count == 2
+
+
+def test_concurrent_cache_misses_fetch_upstream_once():
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return [{"id": 1}]
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                proxy_cache.entry_data(
+                    proxy_cache.get_entry("fakestore:all_products", loader)
+                )
+            )
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert results == [[{"id": 1}]] * 8
+    assert proxy_cache.entry_data(cache.get("fakestore:all_products")) == [{"id": 1}]
+
+
+def test_async_single_flight_survives_leader_cancellation():
+    async def scenario():
+        release = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return "entry"
+
+        leader = asyncio.create_task(proxy_cache._asingle_flight("key", load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(proxy_cache._asingle_flight("key", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        result = await asyncio.wait_for(follower, timeout=5)
+        return result, len(calls), leader.cancelled()
+
+    assert asyncio.run(scenario()) == ("entry", 1, True)
+
+
+def test_stale_entry_is_served_while_refreshing_in_background():
+    cache.set(
+        "fakestore:all_products",
+        {"data": [{"id": 1}], "stale_at": time.time() - 1},
+        60,
+    )
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return [{"id": 1}, {"id": 2}]
+
+    entry = proxy_cache.get_entry("fakestore:all_products", loader)
+    assert proxy_cache.entry_data(entry) == [{"id": 1}]
+    assert refreshed.wait(timeout=5)
+
+    for _ in range(50):
+        entry = cache.get("fakestore:all_products")
+        if entry["stale_at"] > time.time():
+            break
+        time.sleep(0.02)
+    assert proxy_cache.entry_data(entry) == [{"id": 1}, {"id": 2}]
+
+
+@pytest.mark.django_db
+def test_list_products_warms_per_product_entries():
+    catalog = [{"id": 1, "title": "Mochila"}, {"id": 2, "title": "Camiseta"}]
+    upstream = _make_upstream_response(catalog)
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream) as get:
+        client = APIClient()
+        list_response = client.get("/api/products")
+        retrieve_response = client.get("/api/products/2")
+
+    assert list_response.status_code == 200, list_response.content
+    assert retrieve_response.json() == {"id": 2, "title": "Camiseta"}
+    get.assert_called_once_with()
+
+
+@pytest.mark.django_db
+def test_unknown_product_is_negatively_cached():
+    upstream = _make_upstream_response(None)
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream) as get:
+        client = APIClient()
+        first_response = client.get("/api/products/9999")
+        second_response = client.get("/api/products/9999")
+
+    assert first_response.status_code == 404, first_response.content
+    assert second_response.status_code == 404, second_response.content
+    assert second_response.json().get("detail") == "Produto não encontrado."
+    get.assert_called_once_with("/9999")
+
+
+def test_circuit_counts_failures_in_the_window_across_successes():
+    breaker = fakestore_client.get_circuit_breaker()
+    for _ in range(breaker.failure_threshold - 1):
+        breaker.record_failure()
+        breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+
+    with mock.patch("utils.circuit_breaker.time.time", return_value=time.time() + 60):
+        breaker.before_call()
+        breaker.record_success()
+    assert breaker.snapshot()["failures"] == 0
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.django_db
+def test_open_circuit_serves_last_good_payload():
+    catalog = [{"id": 1, "title": "Mochila"}]
+    client = APIClient()
+
+    with mock.patch.object(
+        fakestore_client.get_session(),
+        "get",
+        return_value=_make_upstream_response(catalog),
+    ):
+        assert client.get("/api/products").status_code == 200
+
+    cache.delete("fakestore:all_products")
+    breaker = fakestore_client.get_circuit_breaker()
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with mock.patch.object(fakestore_client.get_session(), "get") as upstream:
+        response = client.get("/api/products")
+        status_response = client.get("/api/products/upstream-status")
+
+    upstream.assert_not_called()
+    assert response.status_code == 200, response.content
+    assert response.json() == catalog
+    assert status_response.json()["state"] == "open"
+
+
+@pytest.mark.django_db
+def test_products_conditional_request_returns_304():
+    upstream = _make_upstream_response([{"id": 1, "title": "Mochila"}])
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream):
+        client = APIClient()
+        response = client.get("/api/products")
+        etag = response.headers["ETag"]
+        conditional_response = client.get("/api/products", HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200, response.content
+    assert "max-age=" in response.headers["Cache-Control"]
+    assert conditional_response.status_code == 304
+    assert conditional_response.content == b""
+
+
+@pytest.mark.django_db
+def test_list_products_filters_sorts_and_paginates():
+    catalog = [
+        {"id": 1, "category": "electronics", "price": 50.0},
+        {"id": 2, "category": "jewelery", "price": 10.0},
+        {"id": 3, "category": "electronics", "price": 20.0},
+        {"id": 4, "category": "electronics", "price": 100.0},
+    ]
+    upstream = _make_upstream_response(catalog)
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream):
+        response = APIClient().get(
+            "/api/products",
+            {
+                "category": "electronics",
+                "min_price": 20,
+                "ordering": "-price",
+                "limit": 2,
+            },
+        )
+
+    assert response.status_code == 200, response.content
+    data = response.json()
+    assert data["count"] == 3
+    assert [product["id"] for product in data["results"]] == [4, 1]
+    assert data["next"] is not None
+
+
+def test_catalog_index_price_range_keeps_the_requested_ordering():
+    catalog = [
+        {
+            "id": i,
+            "category": "x" if i % 2 else "y",
+            "price": float((i * 7) % 10),
+            "title": f"T{(i * 3) % 10}",
+            "rating": {"rate": (i * 5) % 10},
+        }
+        for i in range(1, 21)
+    ]
+    index = catalog_index.CatalogIndex(catalog)
+
+    for category in (None, "x"):
+        for ordering in ("id", "-title", "rating"):
+            expected = index.query(category, ordering=ordering)
+            expected = [p for p in expected if 2 <= p["price"] <= 6]
+            assert index.query(category, 2, 6, ordering) == expected
+
+
+@pytest.mark.django_db
+def test_products_sparse_fieldsets_are_projected_once_per_entry():
+    catalog = [
+        {"id": 1, "title": "A", "category": "x", "rating": {"rate": 4.0, "count": 1}},
+        {"id": 2, "title": "B", "category": "y", "rating": {"rate": 3.0, "count": 2}},
+    ]
+    upstream = _make_upstream_response(catalog)
+
+    with (
+        mock.patch.object(fakestore_client, "get", return_value=upstream),
+        mock.patch("utils.fieldsets.project", wraps=fieldsets.project) as project,
+    ):
+        for _ in range(2):
+            response = APIClient().get(
+                "/api/products", {"fields": "id,title,rating.rate"}
+            )
+            assert response.status_code == 200, response.content
+            assert response.json() == [
+                {"id": 1, "title": "A", "rating": {"rate": 4.0}},
+                {"id": 2, "title": "B", "rating": {"rate": 3.0}},
+            ]
+
+        response = APIClient().get("/api/products/1", {"exclude": "rating,category"})
+        assert response.json() == {"id": 1, "title": "A"}
+        etag = response.headers["ETag"]
+        response = APIClient().get(
+            "/api/products/1", {"exclude": "rating,category"}, HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == 304
+
+    assert project.call_count == 2
+    response = APIClient().get("/api/products", {"fields": "id", "exclude": "title"})
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+def test_list_products_rejects_invalid_ordering():
+    response = APIClient().get("/api/products", {"ordering": "stock"})
+
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params",
+    [{"offset": 10}, {"min_price": 50, "max_price": 10}],
+)
+def test_list_products_rejects_inconsistent_params(params):
+    response = APIClient().get("/api/products", params)
+
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+def test_sync_products_applies_only_changed_rows():
+    catalog = [{"id": 1, "title": "Mochila"}, {"id": 2, "title": "Camiseta"}]
+    with mock.patch.object(
+        fakestore_client, "get", return_value=_make_upstream_response(catalog)
+    ):
+        call_command("sync_products", stdout=io.StringIO())
+
+    unchanged_synced_at = Product.objects.get(pk=1).synced_at
+    catalog = [{"id": 1, "title": "Mochila"}, {"id": 3, "title": "Jaqueta"}]
+    output = io.StringIO()
+    with mock.patch.object(
+        fakestore_client, "get", return_value=_make_upstream_response(catalog)
+    ):
+        call_command("sync_products", stdout=output)
+
+    assert "1 criados, 0 atualizados, 1 removidos, 1 inalterados" in output.getvalue()
+    assert list(Product.objects.values_list("id", flat=True)) == [1, 3]
+    assert Product.objects.get(pk=1).synced_at == unchanged_synced_at
+
+
+@pytest.mark.django_db
+@override_settings(PRODUCT_CATALOG_SOURCE="database")
+def test_products_are_served_from_the_local_catalog():
+    product = {"id": 7, "title": "Relógio"}
+    Product.objects.create(id=7, data=product, content_hash=content_hash(product))
+
+    with mock.patch.object(fakestore_client, "get") as upstream:
+        client = APIClient()
+        retrieve_response = client.get("/api/products/7")
+        missing_response = client.get("/api/products/8")
+
+    upstream.assert_not_called()
+    assert retrieve_response.json() == product
+    assert missing_response.status_code == 404, missing_response.content
+
+
+@pytest.mark.django_db
+def test_async_products_share_the_proxy_cache():
+    catalog = [{"id": 1, "title": "Mochila"}, {"id": 2, "title": "Camiseta"}]
+    upstream = mock.AsyncMock(return_value=_make_upstream_response(catalog))
+
+    with mock.patch.object(fakestore_client, "aget", upstream):
+        client = Client()
+        list_response = client.get("/api/async/products")
+        retrieve_response = client.get("/api/async/products/2")
+        conditional_response = client.get(
+            "/api/async/products", HTTP_IF_NONE_MATCH=list_response.headers["ETag"]
+        )
+
+    assert list_response.status_code == 200, list_response.content
+    assert list_response.json() == catalog
+    assert retrieve_response.json() == {"id": 2, "title": "Camiseta"}
+    assert conditional_response.status_code == 304
+    upstream.assert_awaited_once_with()
+
+
+@pytest.mark.django_db
+def test_async_products_apply_sparse_fieldsets():
+    catalog = [{"id": 1, "title": "Mochila", "category": "x"}]
+    upstream = mock.AsyncMock(return_value=_make_upstream_response(catalog))
+
+    with mock.patch.object(fakestore_client, "aget", upstream):
+        client = Client()
+        list_response = client.get("/api/async/products", {"fields": "id,title"})
+        retrieve_response = client.get("/api/async/products/1", {"exclude": "category"})
+        invalid_response = client.get(
+            "/api/async/products/1", {"fields": "id", "exclude": "title"}
+        )
+
+    assert list_response.json() == [{"id": 1, "title": "Mochila"}]
+    assert retrieve_response.json() == {"id": 1, "title": "Mochila"}
+    assert invalid_response.status_code == 400, invalid_response.content
+
+
+@pytest.mark.django_db
+def test_async_retrieve_unknown_product_returns_404():
+    upstream = mock.AsyncMock(return_value=_make_upstream_response(None))
+
+    with mock.patch.object(fakestore_client, "aget", upstream):
+        response = Client().get("/api/async/products/9999")
+
+    assert response.status_code == 404, response.content
+    assert response.json().get("detail") == "Produto não encontrado."
+
+
+@pytest.mark.django_db
+def test_batch_fetches_only_cache_misses():
+    proxy_cache.store_many({"fakestore:product:1": {"id": 1, "title": "Mochila"}})
+
+    def upstream(path=""):
+        if path == "/2":
+            return _make_upstream_response({"id": 2, "title": "Camiseta"})
+        return _make_upstream_response(None)
+
+    with mock.patch.object(fakestore_client, "get", side_effect=upstream) as get:
+        response = APIClient().get("/api/products/batch", {"ids": "1,2,9999,2"})
+
+    assert response.status_code == 200, response.content
+    assert response.json() == {
+        "results": [{"id": 1, "title": "Mochila"}, {"id": 2, "title": "Camiseta"}],
+        "not_found": [9999],
+        "unavailable": [],
+    }
+    assert sorted(call.args[0] for call in get.call_args_list) == ["/2", "/9999"]
+    assert proxy_cache.entry_data(cache.get("fakestore:product:2")) == {
+        "id": 2,
+        "title": "Camiseta",
+    }
+
+
+@pytest.mark.django_db
+@override_settings(PROXY_BATCH_MAX_WORKERS=3)
+def test_concurrent_batches_share_one_bounded_executor():
+    product_service._executor = None
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def upstream(path=""):
+        with lock:
+            active.append(path)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.remove(path)
+        return _make_upstream_response({"id": int(path[1:])})
+
+    def batch(ids):
+        product_service.get_products(ids)
+
+    with mock.patch.object(fakestore_client, "get", side_effect=upstream):
+        threads = [
+            threading.Thread(target=batch, args=(list(range(start, start + 5)),))
+            for start in (1, 11, 21)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    assert max(peak) <= 3
+    product_service._executor = None
+
+
+@pytest.mark.django_db
+def test_batch_rejects_invalid_ids():
+    response = APIClient().get("/api/products/batch", {"ids": "1,abc"})
+
+    assert response.status_code == 400, response.content
+
+
+@pytest.mark.django_db
+def test_products_are_served_from_prerendered_bytes():
+    catalog = [{"id": pk, "title": f"Produto {pk}"} for pk in range(1, 101)]
+    upstream = _make_upstream_response(catalog)
+
+    with mock.patch.object(fakestore_client, "get", return_value=upstream):
+        client = APIClient()
+        client.get("/api/products")
+        with mock.patch.object(
+            JSONRenderer, "render", side_effect=AssertionError("re-rendered")
+        ):
+            response = client.get("/api/products")
+            gzip_response = client.get("/api/products", HTTP_ACCEPT_ENCODING="gzip")
+
+    assert response.status_code == 200, response.content
+    assert response.headers["Content-Type"] == "application/json"
+    assert json.loads(response.content) == catalog
+    assert gzip_response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(gzip_response.content)) == catalog
+    assert "data" not in cache.get("fakestore:all_products")
+
+
+def _make_worker_cache(**options):
+    return TwoTierCache(
+        str(uuid.uuid4()),
+        {"OPTIONS": {"SHARED_ALIAS": "shared", "L1_TIMEOUT": 5, **options}},
+    )
+
+
+def test_two_tier_cache_shares_values_between_workers():
+    worker_a = _make_worker_cache()
+    worker_b = _make_worker_cache()
+
+    worker_a.set("fakestore:product:1", {"id": 1})
+
+    assert caches["shared"].get("fakestore:product:1") == {"id": 1}
+    assert worker_b.get("fakestore:product:1") == {"id": 1}
+
+    with mock.patch.object(caches["shared"], "get") as shared_get:
+        assert worker_b.get("fakestore:product:1") == {"id": 1}
+    shared_get.assert_not_called()
+
+
+def test_two_tier_cache_l1_is_bounded_and_expires():
+    worker = _make_worker_cache(L1_MAX_ENTRIES=2, L1_TIMEOUT=1)
+
+    worker.set_many({"a": 1, "b": 2, "c": 3})
+    assert list(worker._l1) == [worker.make_key("b"), worker.make_key("c")]
+
+    caches["shared"].set("b", 20)
+    assert worker.get("b") == 2
+    with mock.patch("utils.cache_backends.time.monotonic", return_value=1e12):
+        assert worker.get("b") == 20
+    assert worker.get("a") == 1
+
+
+def test_two_tier_cache_returns_copies():
+    worker = _make_worker_cache()
+    worker.set("fakestore:product:1", {"id": 1})
+
+    worker.get("fakestore:product:1")["id"] = 2
+
+    assert worker.get("fakestore:product:1") == {"id": 1}
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_exposes_cache_upstream_and_endpoint_series():
+    with mock.patch.object(
+        fakestore_client.get_session(),
+        "get",
+        return_value=_make_upstream_response({"id": 1, "title": "Mochila"}),
+    ):
+        APIClient().get("/api/products/1")
+        APIClient().get("/api/products/1")
+
+    assert Client().get("/metrics").status_code in (401, 403)
+    staff = Customer.objects.create(
+        username="staff", email="staff@example.com", is_staff=True
+    )
+    client = APIClient()
+    client.force_authenticate(staff)
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.content.decode()
+    assert 'aiqfome_cache_requests_total{namespace="product",result="hit"}' in body
+    assert 'aiqfome_cache_requests_total{namespace="product",result="miss"}' in body
+    assert 'aiqfome_upstream_requests_total{outcome="2xx",target="product"}' in body
+    assert (
+        'aiqfome_http_requests_total{method="GET",status="200",'
+        'view="FakeStoreProxyViewSet-detail"}' in body
+    )
+
+
+def test_metrics_do_not_touch_the_shared_cache_on_the_request_path():
+    with mock.patch.object(metrics, "coordination_cache") as shared:
+        for _ in range(3):
+            metrics.inc("aiqfome_cache_requests_total", {"namespace": "x"})
+            metrics.observe("aiqfome_cache_lookup_seconds", 0.01, {"namespace": "x"})
+
+    shared.assert_not_called()
+
+
+def test_metrics_are_summed_across_workers():
+    series = ("aiqfome_cache_requests_total", (("namespace", "x"), ("result", "hit")))
+    metrics.inc(series[0], dict(series[1]))
+    before = metrics.collect()["counters"][series]
+
+    registry = caches["shared"].get("metrics:workers")
+    caches["shared"].set(
+        "metrics:workers",
+        {**registry, "outro-host:1": time.time() + 60, "outro-host:2": time.time() - 1},
+    )
+    for worker in ("outro-host:1", "outro-host:2"):
+        caches["shared"].set(
+            f"metrics:worker:{worker}", {"counters": {series: 5}, "histograms": {}}
+        )
+
+    assert metrics.collect()["counters"][series] == before + 5
+
+    with mock.patch.object(metrics, "_worker", "outro-host:3"):
+        metrics.flush()
+    assert "outro-host:2" not in caches["shared"].get("metrics:workers")
@@ -0,0 +1,154 @@
+"""Orçamento de consultas SQL por endpoint.
+
+Cada endpoint tem um número máximo de consultas (`QUERY_BUDGETS`); o teste grava o
+SQL emitido pela requisição e falha, listando as consultas, se o número passar do
+orçamento. Savepoints não contam: em produção a requisição não roda dentro da
+transação do teste e eles viram `BEGIN`/`COMMIT`.
+
+Ao reduzir as consultas de um endpoint, baixe o orçamento junto.
+"""
+
+import re
+from contextlib import contextmanager
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from authentication.tests.test_authentication import _make_login
+
+QUERY_BUDGETS = {
+    # autenticação JWT (1)
+    "customers-list": 1,
+    "customers-detail:get": 1,
+    # autenticação, UPDATE e histórico
+    "customers-detail:patch": 3,
+    # autenticação, snapshot, busca do favorito, INSERT e histórico
+    "favorites-list:post": 5,
+    "favorites-list:get": 1,
+    "favorites-list:get:miss": 2,
+    "favorites-list:get:page": 2,
+    "favorites-detail:get": 2,
+    # autenticação, busca do favorito, UPDATE e histórico
+    "favorites-detail:delete": 4,
+    # autenticação, snapshots, favoritos existentes, INSERT, ids inseridos, histórico
+    # e reconstrução do cache
+    "favorites-bulk": 7,
+    # autenticação, SELECT FOR UPDATE, UPDATE e histórico
+    "favorites-bulk-deactivate": 4,
+    "products-detail": 0,
+}
+
+_SAVEPOINT = re.compile(r"^(RELEASE |ROLLBACK TO )?SAVEPOINT ", re.IGNORECASE)
+
+
+@contextmanager
+def query_budget(endpoint):
+    """Falha se o bloco emitir mais consultas que o orçamento do endpoint."""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+    queries = [
+        query["sql"]
+        for query in context.captured_queries
+        if not _SAVEPOINT.match(query["sql"])
+    ]
+    budget = QUERY_BUDGETS[endpoint]
+    listing = "\n".join(f"{i}. {sql}" for i, sql in enumerate(queries, 1))
+    assert (
+        len(queries) <= budget
+    ), f"{endpoint}: {len(queries)} consultas, orçamento {budget}:\n{listing}"
+
+
+@pytest.fixture
+def client():
+    cache.clear()
+    client = APIClient()
+    token = _make_login().json().get("access")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    client.get("/api/products/1")
+    yield client
+    cache.clear()
+
+
+@pytest.fixture
+def favorite_id(client):
+    return client.post("/api/favorites", {"product_id": 1}, format="json").json()["id"]
+
+
+@pytest.mark.django_db
+def test_customers_query_budget(client):
+    with query_budget("customers-list"):
+        user_id = client.get("/api/customers").json()["id"]
+
+    with query_budget("customers-detail:get"):
+        response = client.get(f"/api/customers/{user_id}")
+    assert response.status_code == 200, response.content
+
+    with query_budget("customers-detail:patch"):
+        response = client.patch(
+            f"/api/customers/{user_id}", {"first_name": "Outro"}, format="json"
+        )
+    assert response.status_code == 200, response.content
+
+
+@pytest.mark.django_db
+def test_favorites_create_query_budget(client, django_capture_on_commit_callbacks):
+    with query_budget("favorites-list:post"):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post("/api/favorites", {"product_id": 1}, format="json")
+    assert response.status_code == 201, response.content
+
+
+@pytest.mark.django_db
+def test_favorites_read_query_budget(client, favorite_id):
+    with query_budget("favorites-list:get:miss"):
+        assert len(client.get("/api/favorites").json()) == 1
+
+    with query_budget("favorites-list:get"):
+        assert len(client.get("/api/favorites").json()) == 1
+
+    with query_budget("favorites-list:get:page"):
+        assert len(client.get("/api/favorites?page_size=10").json()["results"]) == 1
+
+    with query_budget("favorites-detail:get"):
+        response = client.get(f"/api/favorites/{favorite_id}")
+    assert response.status_code == 200, response.content
+
+
+@pytest.mark.django_db
+def test_favorites_destroy_query_budget(
+    client, favorite_id, django_capture_on_commit_callbacks
+):
+    with query_budget("favorites-detail:delete"):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.delete(f"/api/favorites/{favorite_id}")
+    assert response.status_code == 204, response.content
+
+
+@pytest.mark.django_db
+def test_favorites_bulk_query_budget(client, django_capture_on_commit_callbacks):
+    client.get("/api/products")
+
+    with query_budget("favorites-bulk"):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                "/api/favorites/bulk", {"product_ids": [1, 2, 3]}, format="json"
+            )
+    assert response.status_code == 200, response.content
+
+    with query_budget("favorites-bulk-deactivate"):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                "/api/favorites/bulk-deactivate", {"all": True}, format="json"
+            )
+    assert response.status_code == 200, response.content
+
+
+@pytest.mark.django_db
+def test_product_detail_query_budget(client):
+    with query_budget("products-detail"):
+        response = APIClient().get("/api/products/1")
+    assert response.status_code == 200, response.content
@@ -12,9 +12,9 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-from aiqfome.api import FavoritesRestView
+from aiqfome.api import FavoritesRestView, MetricsView
 from authentication.api import CreateCustomerRestView, CustomerRestView
-from utils.FakeStoreProxyViewSet import FakeStoreProxyViewSet
+from utils.FakeStoreProxyViewSet import AsyncFakeStoreProxyView, FakeStoreProxyViewSet
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -34,6 +34,17 @@ urlpatterns = [
     path("api/login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/login/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/login/verify/", TokenVerifyView.as_view(), name="token_verify"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
+    path(
+        "api/async/products",
+        AsyncFakeStoreProxyView.as_view(),
+        name="async_products_list",
+    ),
+    path(
+        "api/async/products/<str:pk>",
+        AsyncFakeStoreProxyView.as_view(),
+        name="async_products_detail",
+    ),
 ]
 if not settings.PRODUCTION:
     urlpatterns += [
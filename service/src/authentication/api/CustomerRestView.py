@@ -2,7 +2,7 @@ from django.db import transaction
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, viewsets
-from rest_framework.exceptions import MethodNotAllowed, NotFound, PermissionDenied
+from rest_framework.exceptions import MethodNotAllowed, PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
@@ -34,6 +34,8 @@ class CustomerRestView(viewsets.ModelViewSet):
 
     def get_object(self):
         pk = self.kwargs.get("pk")
+        if str(pk) == str(self.request.user.pk):
+            return self.request.user
         obj = get_object_or_404(Customer, pk=pk)
         return obj
 
@@ -43,10 +45,7 @@ class CustomerRestView(viewsets.ModelViewSet):
         operation_description="Retrieve the profile of the authenticated user.",
     )
     def list(self, request, *args, **kwargs):
-        instance = Customer.objects.filter(id=request.user.id).first()
-        if not instance:
-            raise NotFound(detail="Customer not found")
-        serializer = self.get_serializer(instance)
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
     @swagger_auto_schema(auto_schema=None)
@@ -70,7 +69,7 @@ class CustomerRestView(viewsets.ModelViewSet):
         Users can only update their own profile unless they are superusers.""",
     )
     def update(self, request, *args, **kwargs):
-        instance = get_object_or_404(Customer, id=kwargs.get("pk"))
+        instance = self.get_object()
 
         if instance.id != request.user.id and not request.user.is_superuser:
             raise PermissionDenied(detail="You can only update your own profile!")
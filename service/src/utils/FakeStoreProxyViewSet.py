@@ -1,63 +1,392 @@
-import requests
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.views import View
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import status, viewsets
-from rest_framework.exceptions import NotFound
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
 from rest_framework.response import Response
 
-from aiqfome.settings.env import CACHE_TIMEOUT, FAKESTORE_BASE_URL
+from utils import (
+    catalog_index,
+    fakestore_client,
+    fieldsets,
+    product_service,
+    proxy_cache,
+)
+from utils.fakestore_client import UpstreamError
+from utils.fieldsets import FieldsQuerySerializer
+from utils.hashing import content_hash
+
+
+class ProductQuerySerializer(FieldsQuerySerializer):
+    """Parâmetros de consulta da listagem de produtos.
+
+    Campos:
+    - category: Categoria exata do produto.
+    - min_price / max_price: Faixa de preço (inclusiva).
+    - ordering: Campo de ordenação, com "-" para ordem decrescente.
+    - limit / offset: Paginação da listagem; `offset` exige `limit`.
+    - fields / exclude: Projeção dos produtos (ver `FieldsQuerySerializer`).
+    """
+
+    category = serializers.CharField(required=False)
+    min_price = serializers.FloatField(required=False, min_value=0)
+    max_price = serializers.FloatField(required=False, min_value=0)
+    ordering = serializers.ChoiceField(
+        choices=[
+            prefix + field
+            for field in catalog_index.ORDERING_KEYS
+            for prefix in ("", "-")
+        ],
+        required=False,
+    )
+    limit = serializers.IntegerField(required=False, min_value=1)
+    offset = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if "offset" in attrs and "limit" not in attrs:
+            raise serializers.ValidationError({"offset": "Informe também `limit`."})
+        if attrs.get("min_price", 0) > attrs.get("max_price", float("inf")):
+            raise serializers.ValidationError(
+                {"min_price": "`min_price` deve ser menor ou igual a `max_price`."}
+            )
+        return attrs
+
+
+def _cache_headers(entry, etag=None):
+    """Monta os headers `ETag`/`Cache-Control` de uma entrada do cache.
+
+    `etag` substitui o da entrada em respostas derivadas dela (ex.: filtradas).
+    """
+    max_age = max(0, int(entry["stale_at"] - time.time()))
+    return {
+        "ETag": f'"{etag or entry["etag"]}"',
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+
+
+def _not_modified(request, headers):
+    """Indica se o `If-None-Match` do cliente bate com o ETag da resposta."""
+    if_none_match = request.headers.get("If-None-Match", "")
+    candidates = {
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    }
+    return headers["ETag"] in candidates or "*" in candidates
+
+
+def _prerendered_body(request, entry, headers):
+    """Retorna o corpo já renderizado da entrada, comprimido se o cliente aceitar gzip.
+
+    Ajusta `headers` para a codificação escolhida. Retorna `None` quando a entrada
+    não tem corpo renderizado (ex.: `PROXY_CACHE_RENDERED` desligado).
+    """
+    if "body" not in entry:
+        return None
+
+    headers["Content-Type"] = entry["content_type"]
+    headers["Vary"] = "Accept-Encoding"
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    if "body_gzip" in entry and "gzip" in accept_encoding:
+        headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = f"W/{headers['ETag']}"
+        return entry["body_gzip"]
+    return entry["body"]
+
+
+def _projected(key, entry, selected, load):
+    """Retorna a projeção dos dados de uma entrada do cache, calculada uma vez por versão.
+
+    A projeção fica em cache em uma chave própria, derivada de `key`, da projeção e
+    do ETag da entrada; uma nova versão da entrada usa uma chave nova.
+
+    Args:
+        key (str): chave base da projeção (ex.: a chave da entrada).
+        entry (dict): entrada do cache.
+        selected (dict): projeção (ver `fieldsets.projection`).
+        load (callable): retorna os dados a projetar.
+
+    Returns:
+        dict | list: dados projetados.
+    """
+    cache_key = f"{key}:{fieldsets.projection_key(selected)}:{entry['etag']}"
+    data = cache.get(cache_key)
+    if data is None:
+        data = fieldsets.project(load(), selected)
+        cache.set(cache_key, data, settings.PROXY_CACHE_HARD_TIMEOUT)
+    return data
+
+
+def _query_catalog(request, entry, params, selected=None):
+    """Aplica filtros, ordenação, projeção e paginação ao catálogo de uma entrada do cache.
+
+    A lista filtrada e projetada fica em cache por entrada (ver `_projected`); só a
+    paginação é feita a cada requisição.
+
+    Args:
+        request (Request): requisição DRF, usada pela paginação.
+        entry (dict): entrada do cache do catálogo.
+        params (dict): parâmetros validados por `ProductQuerySerializer`, sem a projeção.
+        selected (dict): projeção (ver `fieldsets.projection`).
+
+    Returns:
+        tuple: dados da resposta e ETag derivado, ou `(None, None)` sem parâmetros
+        (a resposta é a própria entrada).
+    """
+    if not params and not selected:
+        return None, None
+
+    filters = {
+        "category": params.get("category"),
+        "min_price": params.get("min_price"),
+        "max_price": params.get("max_price"),
+        "ordering": params.get("ordering", "id"),
+    }
+    if selected is None:
+        products = catalog_index.get_index(entry).query(**filters)
+    else:
+        products = _projected(
+            f"{product_service.CATALOG_KEY}:{content_hash(filters)}",
+            entry,
+            selected,
+            lambda: catalog_index.get_index(entry).query(**filters),
+        )
+    paginator = LimitOffsetPagination()
+    page = paginator.paginate_queryset(products, request)
+    data = products if page is None else paginator.get_paginated_response(page).data
+
+    etag = content_hash([entry["etag"], sorted(request.query_params.lists())])
+    return data, etag
+
+
+def _project_product(pk, entry, selected):
+    """Aplica a projeção a uma entrada de produto do cache (ver `_projected`).
+
+    Args:
+        pk (int | str): ID do produto.
+        entry (dict): entrada do cache do produto.
+        selected (dict): projeção (ver `fieldsets.projection`).
+
+    Returns:
+        tuple: dados projetados e ETag derivado.
+    """
+    data = _projected(
+        product_service.product_key(pk),
+        entry,
+        selected,
+        lambda: proxy_cache.entry_data(entry),
+    )
+    etag = content_hash([entry["etag"], fieldsets.projection_key(selected)])
+    return data, etag
+
+
+class ProductBatchQuerySerializer(serializers.Serializer):
+    """Parâmetros de consulta da busca de produtos em lote.
+
+    Campos:
+    - ids: IDs dos produtos separados por vírgula (ex.: "1,2,3").
+    """
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = [int(pk) for pk in value.split(",") if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Informe IDs numéricos separados por vírgula."
+            )
+
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise serializers.ValidationError("Informe ao menos um ID.")
+        if len(ids) > settings.PROXY_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                f"Informe no máximo {settings.PROXY_BATCH_MAX_IDS} IDs."
+            )
+        return ids
 
 
 class FakeStoreProxyViewSet(viewsets.ViewSet):
     """
     Proxy interno para a FakeStore API com cache local.
+
+    Com `PRODUCT_CATALOG_SOURCE = "database"`, os produtos são lidos da tabela
+    `Product` (ver comando `sync_products`) em vez da API externa.
     """
 
     permission_classes = [AllowAny]
 
+    def _cached_response(self, request, entry, data=None, etag=None):
+        """Monta a resposta com `ETag`/`Cache-Control` a partir de uma entrada do cache.
+
+        Se o `If-None-Match` do cliente bate com o ETag, retorna 304 sem corpo.
+        `data` e `etag` substituem os da entrada em respostas derivadas dela; as demais
+        usam o corpo já renderizado da entrada, sem passar pelo renderer do DRF.
+        """
+        headers = _cache_headers(entry, etag)
+        if _not_modified(request, headers):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if etag is None and request.accepted_renderer.format == "json":
+            body = _prerendered_body(request, entry, headers)
+            if body is not None:
+                response = Response(headers=headers)
+                response.content = body
+                return response
+
+        if data is None:
+            data = proxy_cache.entry_data(entry)
+        return Response(data, headers=headers)
+
+    def _bad_gateway(self):
+        return Response(
+            {"error": "Erro ao acessar API externa."},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+
     @swagger_auto_schema(
         tags=["FakeStore Proxy"],
         operation_summary="List all products",
-        operation_description="Retrieve a list of all products from the FakeStore API.",
+        operation_description="""Retrieve a list of all products from the FakeStore API.
+        Supports filtering by category and price range, ordering, limit/offset pagination
+        and `fields`/`exclude` projections (e.g. `?fields=id,title,price,image`).""",
+        query_serializer=ProductQuerySerializer,
     )
     def list(self, request):
-        cache_key = "fakestore:all_products"
-        data = cache.get(cache_key)
+        query = ProductQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = dict(query.validated_data)
+        selected = fieldsets.projection(params)
 
-        if not data:
-            response = requests.get(FAKESTORE_BASE_URL)
-            if response.status_code != 200:
-                return Response(
-                    {"error": "Erro ao acessar API externa."},
-                    status=status.HTTP_502_BAD_GATEWAY,
-                )
-            data = response.json()
-            cache.set(cache_key, data, CACHE_TIMEOUT)
+        try:
+            entry = product_service.get_catalog().entry
+        except UpstreamError:
+            return self._bad_gateway()
 
-        return Response(data)
+        data, etag = _query_catalog(request, entry, params, selected)
+        return self._cached_response(request, entry, data=data, etag=etag)
 
     @swagger_auto_schema(
         tags=["FakeStore Proxy"],
         operation_summary="Retrieve a product by ID",
-        operation_description="Retrieve detailed information about a specific product.",
+        operation_description="""Retrieve detailed information about a specific product.
+        Use `fields` or `exclude` to return only part of it.""",
+        query_serializer=FieldsQuerySerializer,
     )
     def retrieve(self, request, pk=None):
-        cache_key = f"fakestore:product:{pk}"
-        data = cache.get(cache_key)
-
-        if not data:
-            response = requests.get(f"{FAKESTORE_BASE_URL}/{pk}")
-            if not response.content:
-                raise NotFound(detail="Produto não encontrado.")
-            elif response.status_code != 200:
-                return Response(
-                    {"error": "Erro ao acessar API externa."},
-                    status=status.HTTP_502_BAD_GATEWAY,
-                )
-            data = response.json()
-            cache.set(cache_key, data, CACHE_TIMEOUT)
-        else:
-            print(f"Produto {pk} encontrado no cache.")
-
-        return Response(data)
+        query = FieldsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        selected = fieldsets.projection(dict(query.validated_data))
+
+        try:
+            entry = product_service.get_product(pk).entry
+        except UpstreamError:
+            return self._bad_gateway()
+
+        if selected is None:
+            return self._cached_response(request, entry)
+
+        data, etag = _project_product(pk, entry, selected)
+        return self._cached_response(request, entry, data=data, etag=etag)
+
+    @swagger_auto_schema(
+        tags=["FakeStore Proxy"],
+        operation_summary="Retrieve products in batch",
+        operation_description="""Retrieve several products by ID in a single call (e.g. `?ids=1,2,3`).
+        Products that do not exist are listed in `not_found`, and products unavailable upstream in `unavailable`.""",
+        query_serializer=ProductBatchQuerySerializer,
+    )
+    @action(detail=False, methods=["get"], url_path="batch")
+    def batch(self, request):
+        query = ProductBatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ids = query.validated_data["ids"]
+
+        result = product_service.get_products(ids)
+
+        return Response(
+            {
+                "results": [product.data for product in result.found.values()],
+                "not_found": result.not_found,
+                "unavailable": result.unavailable,
+            }
+        )
+
+    @swagger_auto_schema(
+        tags=["FakeStore Proxy"],
+        operation_summary="Upstream circuit status",
+        operation_description="Retrieve the circuit breaker state for the FakeStore API.",
+    )
+    @action(detail=False, methods=["get"], url_path="upstream-status")
+    def upstream_status(self, request):
+        return Response(fakestore_client.get_circuit_breaker().snapshot())
+
+
+class AsyncFakeStoreProxyView(View):
+    """
+    Versão assíncrona da listagem e da consulta por ID do `FakeStoreProxyViewSet`.
+
+    Usa o cliente HTTP não bloqueante e a mesma camada de cache do proxy; rodando
+    sob ASGI, um worker mantém várias chamadas ao upstream em andamento ao mesmo
+    tempo. Aceita os mesmos parâmetros de consulta e headers condicionais.
+    """
+
+    async def get(self, request, pk=None):
+        try:
+            if pk is None:
+                query = ProductQuerySerializer(data=request.GET)
+                query.is_valid(raise_exception=True)
+                params = dict(query.validated_data)
+                selected = fieldsets.projection(params)
+                entry = (await product_service.aget_catalog()).entry
+                if selected is None:
+                    data, etag = _query_catalog(Request(request), entry, params)
+                else:
+                    # a projeção lê e grava o cache, então roda fora do event loop
+                    data, etag = await sync_to_async(
+                        _query_catalog, thread_sensitive=False
+                    )(Request(request), entry, params, selected)
+            else:
+                query = FieldsQuerySerializer(data=request.GET)
+                query.is_valid(raise_exception=True)
+                selected = fieldsets.projection(dict(query.validated_data))
+                entry = (await product_service.aget_product(pk)).entry
+                data, etag = None, None
+                if selected is not None:
+                    data, etag = await sync_to_async(
+                        _project_product, thread_sensitive=False
+                    )(pk, entry, selected)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return JsonResponse({"detail": e.detail}, status=status.HTTP_404_NOT_FOUND)
+        except UpstreamError:
+            return JsonResponse(
+                {"error": "Erro ao acessar API externa."},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+
+        headers = _cache_headers(entry, etag)
+        if _not_modified(request, headers):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if etag is None:
+            body = _prerendered_body(request, entry, headers)
+            if body is not None:
+                return HttpResponse(body, headers=headers)
+
+        return JsonResponse(
+            proxy_cache.entry_data(entry) if data is None else data,
+            safe=False,
+            headers=headers,
+            json_dumps_params={"ensure_ascii": False},
+        )
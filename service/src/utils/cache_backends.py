@@ -0,0 +1,191 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# O Django cria uma instância do backend por thread; o L1 fica no nível do módulo
+# (por `LOCATION`) para ser compartilhado pelas threads do worker, como no LocMemCache
+_l1_caches = {}
+_l1_locks = {}
+
+
+def coordination_cache():
+    """Retorna o cache compartilhado usado para coordenar os workers.
+
+    Locks, versões, estado do circuit breaker e métricas precisam ser vistos na hora
+    por todos os workers, então usam o alias `COORDINATION_CACHE_ALIAS` (o L2)
+    diretamente, sem passar pelo L1 de cada worker.
+
+    Returns:
+        BaseCache: cache compartilhado.
+    """
+    return caches[settings.COORDINATION_CACHE_ALIAS]
+
+
+class TwoTierCache(BaseCache):
+    """Cache em dois níveis: um LRU pequeno em memória (L1) na frente de um cache compartilhado (L2).
+
+    O L1 é local a cada worker e limitado a `L1_MAX_ENTRIES` entradas, cada uma
+    vivendo no máximo `L1_TIMEOUT` segundos (ou menos, se o timeout pedido for
+    menor). O L2 é outro alias de `CACHES` (`SHARED_ALIAS`), compartilhado entre os
+    workers, com seu próprio `TIMEOUT`. Escritas vão para os dois níveis; leituras
+    consultam o L1 e, em caso de miss, o L2.
+
+    Operações que precisam ser atômicas entre workers (`add`, `incr`) são
+    resolvidas no L2. Como o L1 de outros workers só expira pelo TTL, valores que
+    precisam ser vistos na hora por todos (locks, estado de circuito) devem usar o
+    L2 diretamente.
+
+    Exemplo:
+    ```python
+        CACHES = {
+            "default": {
+                "BACKEND": "utils.cache_backends.TwoTierCache",
+                "LOCATION": "aiqfome-l1",
+                "OPTIONS": {"SHARED_ALIAS": "shared", "L1_MAX_ENTRIES": 1000, "L1_TIMEOUT": 5},
+            },
+            "shared": {"BACKEND": "django.core.cache.backends.redis.RedisCache", ...},
+        }
+    ```
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED_ALIAS", "shared")
+        self._l1_max_entries = options.get("L1_MAX_ENTRIES", 1000)
+        self._l1_timeout = options.get("L1_TIMEOUT", 5)
+        self._l1 = _l1_caches.setdefault(location, OrderedDict())
+        self._lock = _l1_locks.setdefault(location, threading.Lock())
+
+    @property
+    def shared(self):
+        """Cache compartilhado (L2)."""
+        return caches[self._shared_alias]
+
+    def _l1_get(self, key):
+        with self._lock:
+            item = self._l1.get(key)
+            if item is None:
+                return None
+            expires_at, pickled = item
+            if expires_at <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout):
+        l1_timeout = (
+            self._l1_timeout if timeout is None else min(timeout, self._l1_timeout)
+        )
+        if l1_timeout <= 0:
+            self._l1_delete(key)
+            return
+
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + l1_timeout, pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            return self._l1.pop(key, None) is not None
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(l1_key)
+        if value is not None:
+            return value
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self._l1_set(l1_key, value, self._l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(
+                self.make_and_validate_key(key, version=version), value, timeout
+            )
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        if self._l1_get(l1_key) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        misses = []
+        for key in keys:
+            value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if value is None:
+                misses.append(key)
+            else:
+                found[key] = value
+
+        if misses:
+            shared_found = self.shared.get_many(misses, version=version)
+            for key, value in shared_found.items():
+                self._l1_set(
+                    self.make_and_validate_key(key, version=version),
+                    value,
+                    self._l1_timeout,
+                )
+            found.update(shared_found)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(
+                    self.make_and_validate_key(key, version=version), value, timeout
+                )
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
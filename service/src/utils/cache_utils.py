@@ -1,28 +1,318 @@
+import bisect
+import time
+from datetime import datetime
+
+from django.conf import settings
 from django.core.cache import cache
 
 from aiqfome.models import Favorites
 from aiqfome.serializers import FavoritesSerializer
-from aiqfome.settings import CACHE_TIMEOUT
+from utils import fieldsets, metrics
+from utils.cache_backends import coordination_cache
+from utils.hashing import content_hash
+
+
+def active_favorites(user_id):
+    """Retorna os favoritos ativos do usuário, do mais recente para o mais antigo.
+
+    A consulta é servida, já na ordem, pelo índice parcial
+    `idx_customer_active_created`, sem ordenação em memória.
+
+    Args:
+        user_id (int): id do usuário (customer).
+
+    Returns:
+        QuerySet: favoritos ativos com o snapshot do produto.
+    """
+    return (
+        Favorites.objects.filter(customer_id=user_id, active=True)
+        .select_related("snapshot")
+        .order_by("-created_at")
+    )
+
+
+def get_favorites_cache_version(user_id):
+    """Retorna a versão atual do cache de favoritos do usuário.
+
+    A versão inicial é baseada no relógio, para que uma versão perdida (ex.: chave
+    removida do cache compartilhado) nunca volte a apontar para dados antigos.
+
+    Args:
+        user_id (int): id do usuário (customer).
+
+    Returns:
+        int: versão atual.
+    """
+    version_key = f"fakestore:all_products:{user_id}:version"
+    version = coordination_cache().get(version_key)
+    if version is None:
+        coordination_cache().add(version_key, time.time_ns(), None)
+        version = coordination_cache().get(version_key)
+    return version
+
+
+def bump_favorites_cache_version(user_id):
+    """Invalida o cache de favoritos do usuário em todos os workers.
+
+    Args:
+        user_id (int): id do usuário (customer).
+
+    Returns:
+        int: nova versão.
+    """
+    version_key = f"fakestore:all_products:{user_id}:version"
+    try:
+        return coordination_cache().incr(version_key)
+    except ValueError:
+        get_favorites_cache_version(user_id)
+        return coordination_cache().incr(version_key)
+
+
+def bump_favorites_cache_versions(user_ids):
+    """Invalida o cache de favoritos de vários usuários com uma única escrita.
+
+    Em vez de um `incr` por usuário, grava uma nova versão baseada no relógio para
+    todos de uma vez. A versão nova nunca foi usada, então o pior caso em uma
+    corrida com `bump_favorites_cache_version` é uma reconstrução a mais.
+
+    Args:
+        user_ids (list): ids dos usuários (customers).
+    """
+    version = time.time_ns()
+    coordination_cache().set_many(
+        {f"fakestore:all_products:{user_id}:version": version for user_id in user_ids},
+        None,
+    )
+
+
+def favorites_cache_key(user_id, version=None):
+    """Retorna a chave do cache de favoritos do usuário na versão atual.
+
+    Args:
+        user_id (int): id do usuário (customer).
+        version (int): versão da chave; por padrão, a atual.
+
+    Returns:
+        str: chave do cache.
+    """
+    if version is None:
+        version = get_favorites_cache_version(user_id)
+    return f"fakestore:all_products:{user_id}:v{version}"
+
+
+def _favorite_item_key(user_id, entry):
+    favorite_id, _, updated_at = entry
+    return f"fakestore:all_products:{user_id}:item:{favorite_id}:{updated_at}"
 
 
-def update_favorites_cache_for_user(user_id, invalidate=False):
+def _favorite_index_entry(item):
+    created_at = datetime.fromisoformat(item["created_at"]).timestamp()
+    return (str(item["id"]), created_at, item["updated_at"])
+
+
+def get_favorites_for_user(user_id, selected=None):
+    """Retorna a lista de favoritos do usuário, do cache quando a versão está em dia.
+
+    A lista fica em cache como um índice ordenado (`id`, `created_at`,
+    `updated_at`) na chave da versão atual e um item por favorito, lidos com um
+    único `get_many`. A chave de cada item inclui o `updated_at`, então continua
+    válida entre versões enquanto o favorito não muda. Se faltar algum item, a lista
+    é reconstruída a partir do banco. Listas com mais de
+    `FAVORITES_CACHE_MAX_ITEMS` favoritos não ficam em cache e são lidas do banco.
+
+    Com `selected`, retorna a projeção da lista, guardada em uma chave própria na
+    mesma versão: é calculada uma vez por versão e invalidada junto com a lista.
+
+    Args:
+        user_id (int): id do usuário (customer).
+        selected (dict): projeção (ver `fieldsets.projection`).
+
+    Returns:
+        list: lista serializada de favoritos ativos do usuário.
+    """
+    with metrics.timer("aiqfome_cache_lookup_seconds", {"namespace": "favorites"}):
+        version = get_favorites_cache_version(user_id)
+        cache_key = favorites_cache_key(user_id, version)
+        if selected:
+            projected_key = f"{cache_key}:{fieldsets.projection_key(selected)}"
+            data = cache.get(projected_key)
+            metrics.inc(
+                "aiqfome_cache_requests_total",
+                {
+                    "namespace": "favorites_projection",
+                    "result": "miss" if data is None else "hit",
+                },
+            )
+            if data is not None:
+                return data
+
+        data = None
+        index = cache.get(cache_key)
+        if index is not None:
+            keys = [_favorite_item_key(user_id, entry) for entry in index]
+            items = cache.get_many(keys) if keys else {}
+            if len(items) == len(keys):
+                data = [items[key] for key in keys]
+        metrics.inc(
+            "aiqfome_cache_requests_total",
+            {"namespace": "favorites", "result": "miss" if data is None else "hit"},
+        )
+        if data is None:
+            with metrics.timer(
+                "aiqfome_cache_load_seconds", {"namespace": "favorites"}
+            ):
+                data = update_favorites_cache_for_user(
+                    user_id, bump=False, version=version
+                )
+
+        if selected:
+            data = fieldsets.project(data, selected)
+            cache.set(projected_key, data, settings.FAVORITES_CACHE_TIMEOUT)
+        return data
+
+
+def get_favorites_page(request, paginator, selected=None):
+    """Retorna uma página da lista de favoritos do usuário, por cursor.
+
+    As páginas são buscadas por `id` (uuid7, ordenado pelo tempo) com `WHERE id <
+    cursor` sobre o índice parcial `idx_customer_active_id`, sem OFFSET. Com
+    `FAVORITES_PAGE_CACHE`, a página (já projetada) fica em cache na versão atual
+    do usuário e é invalidada junto com a lista.
+
+    Args:
+        request (Request): requisição DRF, com `cursor` e `page_size`.
+        paginator (CursorPagination): paginação por cursor da view.
+        selected (dict): projeção (ver `fieldsets.projection`).
+
+    Returns:
+        dict: página com `next`, `previous` e `results`.
+    """
+    user_id = request.user.id
+    cache_key = None
+    if settings.FAVORITES_PAGE_CACHE:
+        params = content_hash(sorted(request.query_params.lists()))
+        cache_key = f"{favorites_cache_key(user_id)}:page:{params}"
+        data = cache.get(cache_key)
+        metrics.inc(
+            "aiqfome_cache_requests_total",
+            {
+                "namespace": "favorites_page",
+                "result": "miss" if data is None else "hit",
+            },
+        )
+        if data is not None:
+            return data
+
+    queryset = Favorites.objects.filter(
+        customer_id=user_id, active=True
+    ).select_related("snapshot")
+    page = paginator.paginate_queryset(queryset, request)
+    data = paginator.get_paginated_response(
+        fieldsets.project(FavoritesSerializer(page, many=True).data, selected)
+    ).data
+
+    if cache_key is not None:
+        cache.set(cache_key, data, settings.FAVORITES_CACHE_TIMEOUT)
+    return data
+
+
+def update_favorites_cache_for_user(user_id, invalidate=False, bump=True, version=None):
     """Atualiza o cache de favoritos do usuário e retorna os dados serializados.
 
+    A atualização troca a versão da chave no cache compartilhado, então todos os
+    workers deixam de usar a lista anterior na próxima leitura.
+
+    A lista é gravada na versão lida antes da consulta ao banco. Se uma escrita
+    concorrente trocar a versão durante a consulta, a lista (possivelmente sem essa
+    escrita) fica na versão antiga, que ninguém mais lê, em vez de ser servida na
+    nova.
+
+    Listas com mais de `FAVORITES_CACHE_MAX_ITEMS` favoritos não são gravadas: o
+    índice é lido e regravado inteiro a cada escrita, então o limite mantém esse
+    custo (e o `get_many` da leitura) pequeno.
+
     Args:
         user_id (int): id do usuário (customer) cujo cache deve ser atualizado.
+        invalidate (bool): apenas invalida o cache, sem reconstruí-lo.
+        bump (bool): troca a versão antes de reconstruir o cache.
+        version (int): sem `bump`, versão já lida pelo chamador; por padrão, a atual.
 
     Returns:
         list: lista serializada de favoritos ativos do usuário.
     """
-    cache_key = f"fakestore:all_products:{user_id}"
+    if bump:
+        version = bump_favorites_cache_version(user_id)
+    elif version is None:
+        version = get_favorites_cache_version(user_id)
 
     if invalidate:
-        cache.delete(cache_key)
         return []
 
-    queryset = Favorites.objects.filter(customer_id=user_id, active=True).order_by(
-        "-created_at"
+    data = FavoritesSerializer(active_favorites(user_id), many=True).data
+    if len(data) > settings.FAVORITES_CACHE_MAX_ITEMS:
+        return data
+
+    index = [_favorite_index_entry(item) for item in data]
+    cache.set_many(
+        {_favorite_item_key(user_id, entry): item for entry, item in zip(index, data)},
+        settings.FAVORITES_CACHE_TIMEOUT,
+    )
+    cache.set(
+        favorites_cache_key(user_id, version), index, settings.FAVORITES_CACHE_TIMEOUT
     )
-    data = FavoritesSerializer(queryset, many=True).data
-    cache.set(cache_key, data, CACHE_TIMEOUT)
     return data
+
+
+def patch_favorites_cache_for_user(user_id, add=None, remove=None):
+    """Aplica uma escrita ao cache de favoritos do usuário sem reconstruí-lo.
+
+    Grava só o item `add` (se houver) e um índice novo, na nova versão, com `add`
+    inserido na posição de `created_at` e/ou sem o favorito `remove`; os demais
+    itens continuam nas suas chaves, sem consultar o banco nem reserializar a
+    lista. Sem índice em cache, apenas troca a versão; a próxima leitura reconstrói
+    a lista. O mesmo acontece quando outro worker está aplicando uma escrita ao
+    mesmo usuário ou troca a versão no meio tempo, para não perder nenhuma das duas.
+
+    O índice é lido e regravado inteiro, em O(n), mas só guarda `id` e datas e tem
+    no máximo `FAVORITES_CACHE_MAX_ITEMS` entradas; acima disso a lista sai do cache.
+
+    Args:
+        user_id (int): id do usuário (customer).
+        add (dict): favorito serializado a incluir na lista.
+        remove (str): id do favorito a retirar da lista.
+    """
+    lock_key = f"fakestore:all_products:{user_id}:patch"
+    if not coordination_cache().add(lock_key, True, settings.PROXY_LOCK_TIMEOUT):
+        bump_favorites_cache_version(user_id)
+        return
+
+    try:
+        version = get_favorites_cache_version(user_id)
+        index = cache.get(favorites_cache_key(user_id, version))
+        new_version = bump_favorites_cache_version(user_id)
+        if index is None or new_version != version + 1:
+            return
+
+        ids = {str(remove)} if remove is not None else set()
+        if add is not None:
+            entry = _favorite_index_entry(add)
+            ids.add(entry[0])
+        index = [entry for entry in index if entry[0] not in ids]
+        if add is not None:
+            cache.set(
+                _favorite_item_key(user_id, entry),
+                add,
+                settings.FAVORITES_CACHE_TIMEOUT,
+            )
+            position = bisect.bisect_left(index, -entry[1], key=lambda e: -e[1])
+            index.insert(position, entry)
+        if len(index) > settings.FAVORITES_CACHE_MAX_ITEMS:
+            return
+
+        cache.set(
+            favorites_cache_key(user_id, new_version),
+            index,
+            settings.FAVORITES_CACHE_TIMEOUT,
+        )
+    finally:
+        coordination_cache().delete(lock_key)
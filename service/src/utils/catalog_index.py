@@ -0,0 +1,113 @@
+import bisect
+import threading
+
+from utils import proxy_cache
+
+ORDERING_KEYS = {
+    "id": lambda product: product.get("id") or 0,
+    "price": lambda product: product.get("price") or 0,
+    "title": lambda product: (product.get("title") or "").lower(),
+    "rating": lambda product: (product.get("rating") or {}).get("rate") or 0,
+}
+
+_current = (None, None)
+_current_lock = threading.Lock()
+
+
+class CatalogIndex(object):
+    """Índice em memória do catálogo para filtrar, ordenar e paginar sem reordenar a lista.
+
+    Para cada categoria (e para o catálogo inteiro, categoria `None`) guarda uma
+    lista pré-ordenada por campo de `ORDERING_KEYS` e os preços em ordem crescente,
+    usados para aplicar a faixa de preço com busca binária. Para os demais campos
+    guarda também, na ordem de preço, a posição de cada produto na lista ordenada
+    pelo campo, para reordenar só os produtos da faixa.
+    """
+
+    def __init__(self, products):
+        groups = {None: list(products)}
+        for product in products:
+            groups.setdefault(product.get("category"), []).append(product)
+
+        self._orderings = {}
+        self._prices = {}
+        self._positions = {}
+        for category, items in groups.items():
+            for field, key in ORDERING_KEYS.items():
+                self._orderings[(category, field)] = sorted(items, key=key)
+            by_price = self._orderings[(category, "price")]
+            self._prices[category] = [
+                ORDERING_KEYS["price"](product) for product in by_price
+            ]
+            for field in ORDERING_KEYS:
+                if field == "price":
+                    continue
+                position = {
+                    id(product): i
+                    for i, product in enumerate(self._orderings[(category, field)])
+                }
+                self._positions[(category, field)] = [
+                    position[id(product)] for product in by_price
+                ]
+
+    def query(self, category=None, min_price=None, max_price=None, ordering="id"):
+        """Retorna os produtos que atendem aos filtros, na ordem pedida.
+
+        Args:
+            category (str): categoria exata do produto.
+            min_price (float): preço mínimo (inclusivo).
+            max_price (float): preço máximo (inclusivo).
+            ordering (str): campo de `ORDERING_KEYS`, com prefixo "-" para ordem decrescente.
+
+        Returns:
+            list: produtos filtrados e ordenados.
+        """
+        descending = ordering.startswith("-")
+        field = ordering.lstrip("-")
+
+        by_price = self._orderings.get((category, "price"))
+        if by_price is None:
+            return []
+
+        if min_price is None and max_price is None:
+            items = self._orderings[(category, field)]
+        else:
+            prices = self._prices[category]
+            low = 0 if min_price is None else bisect.bisect_left(prices, min_price)
+            high = (
+                len(prices)
+                if max_price is None
+                else bisect.bisect_right(prices, max_price)
+            )
+            if field == "price":
+                items = by_price[low:high]
+            else:
+                ordered = self._orderings[(category, field)]
+                positions = sorted(self._positions[(category, field)][low:high])
+                items = [ordered[position] for position in positions]
+
+        return items[::-1] if descending else items
+
+
+def get_index(entry):
+    """Retorna o índice da entrada do catálogo, construindo-o uma vez por versão.
+
+    O índice fica em memória no processo e só é reconstruído quando o ETag da
+    entrada muda, ou seja, uma vez a cada atualização do cache.
+
+    Args:
+        entry (dict): entrada do cache do catálogo (ver `proxy_cache.get_entry`).
+
+    Returns:
+        CatalogIndex: índice do catálogo.
+    """
+    global _current
+
+    etag, index = _current
+    if etag != entry["etag"]:
+        with _current_lock:
+            etag, index = _current
+            if etag != entry["etag"]:
+                index = CatalogIndex(proxy_cache.entry_data(entry))
+                _current = (entry["etag"], index)
+    return index
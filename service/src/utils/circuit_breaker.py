@@ -0,0 +1,123 @@
+import time
+
+from utils.cache_backends import coordination_cache
+
+
+class CircuitState(object):
+    """Object representando os estados do circuit breaker.
+
+    Atributos:
+        - CLOSED (str): Fechado, chamadas passam normalmente.
+        - OPEN (str): Aberto, chamadas são recusadas sem acessar o upstream.
+        - HALF_OPEN (str): Semiaberto, uma única chamada de teste é permitida.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuito está aberto."""
+
+
+class CircuitBreaker(object):
+    """Circuit breaker com estado compartilhado entre os workers via cache (`COORDINATION_CACHE_ALIAS`).
+
+    Após `failure_threshold` falhas dentro de `failure_window` segundos o circuito
+    abre e as chamadas são recusadas por `recovery_timeout` segundos. As falhas são
+    contadas em uma janela fixa, iniciada na primeira falha, e não precisam ser
+    seguidas: sucessos com o circuito fechado não zeram o contador, para não custar
+    uma escrita no cache compartilhado a cada chamada. Depois disso
+    ele fica semiaberto: um único worker faz a chamada de teste, que fecha o
+    circuito em caso de sucesso ou o reabre em caso de falha.
+    """
+
+    def __init__(self, name, failure_threshold, failure_window, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+
+    @property
+    def _failures_key(self):
+        return f"circuit:{self.name}:failures"
+
+    @property
+    def _opened_at_key(self):
+        return f"circuit:{self.name}:opened_at"
+
+    @property
+    def _probe_key(self):
+        return f"circuit:{self.name}:probe"
+
+    def _state_for(self, opened_at):
+        if opened_at is None:
+            return CircuitState.CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    @property
+    def state(self):
+        return self._state_for(coordination_cache().get(self._opened_at_key))
+
+    def before_call(self):
+        """Verifica se a chamada pode seguir.
+
+        Raises:
+            CircuitOpenError: quando o circuito está aberto, ou semiaberto com
+                outra chamada de teste em andamento.
+        """
+        state = self.state
+        if state == CircuitState.OPEN:
+            raise CircuitOpenError(f"Circuito {self.name} aberto.")
+        if state == CircuitState.HALF_OPEN and not coordination_cache().add(
+            self._probe_key, True, self.recovery_timeout
+        ):
+            raise CircuitOpenError(f"Circuito {self.name} em teste.")
+
+    def record_success(self):
+        """Fecha o circuito após uma chamada de teste bem-sucedida.
+
+        Com o circuito fechado não faz nada: as falhas anteriores continuam
+        contando até o fim da janela.
+        """
+        if coordination_cache().get(self._opened_at_key) is not None:
+            coordination_cache().delete_many(
+                [self._opened_at_key, self._failures_key, self._probe_key]
+            )
+
+    def record_failure(self):
+        """Contabiliza uma falha, abrindo o circuito ao atingir o limite."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+
+        coordination_cache().add(self._failures_key, 0, self.failure_window)
+        try:
+            failures = coordination_cache().incr(self._failures_key)
+        except ValueError:
+            failures = 1
+            coordination_cache().set(self._failures_key, failures, self.failure_window)
+
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        coordination_cache().set(self._opened_at_key, time.time(), None)
+        coordination_cache().delete_many([self._failures_key, self._probe_key])
+
+    def snapshot(self):
+        """Retorna o estado atual para monitoramento.
+
+        Returns:
+            dict: nome, estado, falhas recentes e instante de abertura do circuito.
+        """
+        opened_at = coordination_cache().get(self._opened_at_key)
+        return {
+            "name": self.name,
+            "state": self._state_for(opened_at),
+            "failures": coordination_cache().get(self._failures_key, 0),
+            "opened_at": opened_at,
+        }
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import metrics
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class UpstreamError(Exception):
+    """Erro ao acessar a FakeStore API (timeout, falha de conexão ou status inesperado)."""
+
+
+def _build_session():
+    """Cria a sessão HTTP com pool de conexões, keep-alive e política de retry.
+
+    Só falhas de conexão e status de `RETRY_STATUSES` são repetidos. Um timeout de
+    leitura não é: com o upstream travado, cada repetição prenderia o worker por
+    mais `FAKESTORE_READ_TIMEOUT` segundos antes de o circuit breaker contar a falha.
+
+    Returns:
+        requests.Session: sessão configurada para a FakeStore API.
+    """
+    retry = Retry(
+        total=settings.FAKESTORE_MAX_RETRIES,
+        connect=settings.FAKESTORE_MAX_RETRIES,
+        read=0,
+        status=settings.FAKESTORE_MAX_RETRIES,
+        backoff_factor=settings.FAKESTORE_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.FAKESTORE_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.headers.update({"Accept": "application/json", "Connection": "keep-alive"})
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _record_call(path, outcome, started=None):
+    """Contabiliza uma chamada à FakeStore API e, se houve I/O, sua latência."""
+    labels = {"target": "product" if path else "catalog"}
+    metrics.inc("aiqfome_upstream_requests_total", {**labels, "outcome": outcome})
+    if started is not None:
+        metrics.observe(
+            "aiqfome_upstream_request_seconds", time.perf_counter() - started, labels
+        )
+
+
+def _outcome(status_code):
+    return f"{status_code // 100}xx"
+
+
+def get_circuit_breaker():
+    """Retorna o circuit breaker da FakeStore API (estado compartilhado via cache).
+
+    Returns:
+        CircuitBreaker: circuit breaker configurado a partir do settings.
+    """
+    return CircuitBreaker(
+        "fakestore",
+        failure_threshold=settings.FAKESTORE_CIRCUIT_FAILURE_THRESHOLD,
+        failure_window=settings.FAKESTORE_CIRCUIT_FAILURE_WINDOW,
+        recovery_timeout=settings.FAKESTORE_CIRCUIT_RECOVERY_TIMEOUT,
+    )
+
+
+def get_session():
+    """Retorna a sessão HTTP compartilhada do processo, criando-a na primeira chamada.
+
+    Returns:
+        requests.Session: sessão compartilhada para a FakeStore API.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get(path=""):
+    """Executa um GET na FakeStore API usando a sessão compartilhada.
+
+    Args:
+        path (str): caminho relativo a `FAKESTORE_BASE_URL` (ex.: "/3").
+
+    Returns:
+        requests.Response: resposta da API externa.
+
+    Raises:
+        UpstreamError: quando a requisição falha por timeout ou erro de conexão, ou
+            quando o circuit breaker está aberto.
+    """
+    breaker = get_circuit_breaker()
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        _record_call(path, "circuit_open")
+        raise UpstreamError(str(e)) from e
+
+    started = time.perf_counter()
+    try:
+        response = get_session().get(
+            f"{settings.FAKESTORE_BASE_URL}{path}",
+            timeout=(
+                settings.FAKESTORE_CONNECT_TIMEOUT,
+                settings.FAKESTORE_READ_TIMEOUT,
+            ),
+        )
+    except requests.RequestException as e:
+        _record_call(path, "error", started)
+        breaker.record_failure()
+        raise UpstreamError(str(e)) from e
+
+    _record_call(path, _outcome(response.status_code), started)
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def get_async_client():
+    """Retorna o cliente HTTP assíncrono do event loop atual, criando-o se preciso.
+
+    O cliente mantém um pool de conexões keep-alive e é compartilhado pelas
+    requisições servidas no mesmo event loop (um por worker ASGI).
+
+    Returns:
+        httpx.AsyncClient: cliente assíncrono para a FakeStore API.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(
+                settings.FAKESTORE_READ_TIMEOUT,
+                connect=settings.FAKESTORE_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.FAKESTORE_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.FAKESTORE_POOL_MAXSIZE,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=settings.FAKESTORE_MAX_RETRIES),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aget(path=""):
+    """Versão assíncrona de `get`, sem bloquear o worker durante o I/O.
+
+    Falhas de conexão são repetidas pelo transporte; respostas com status de
+    `RETRY_STATUSES` são repetidas com backoff exponencial.
+
+    Args:
+        path (str): caminho relativo a `FAKESTORE_BASE_URL` (ex.: "/3").
+
+    Returns:
+        httpx.Response: resposta da API externa.
+
+    Raises:
+        UpstreamError: quando a requisição falha por timeout ou erro de conexão, ou
+            quando o circuit breaker está aberto.
+    """
+    breaker = get_circuit_breaker()
+    try:
+        await sync_to_async(breaker.before_call, thread_sensitive=False)()
+    except CircuitOpenError as e:
+        _record_call(path, "circuit_open")
+        raise UpstreamError(str(e)) from e
+
+    client = get_async_client()
+    url = f"{settings.FAKESTORE_BASE_URL}{path}"
+    started = time.perf_counter()
+    try:
+        for attempt in range(settings.FAKESTORE_MAX_RETRIES + 1):
+            response = await client.get(url)
+            if (
+                response.status_code not in RETRY_STATUSES
+                or attempt == settings.FAKESTORE_MAX_RETRIES
+            ):
+                break
+            await asyncio.sleep(settings.FAKESTORE_RETRY_BACKOFF * 2**attempt)
+    except httpx.HTTPError as e:
+        _record_call(path, "error", started)
+        await sync_to_async(breaker.record_failure, thread_sensitive=False)()
+        raise UpstreamError(str(e)) from e
+
+    _record_call(path, _outcome(response.status_code), started)
+    if response.status_code >= 500:
+        await sync_to_async(breaker.record_failure, thread_sensitive=False)()
+    else:
+        await sync_to_async(breaker.record_success, thread_sensitive=False)()
+    return response
@@ -0,0 +1,123 @@
+from rest_framework import serializers
+
+from utils.hashing import content_hash
+
+
+class FieldsQuerySerializer(serializers.Serializer):
+    """Parâmetros de projeção (sparse fieldsets) das respostas.
+
+    Campos:
+    - fields: Campos a manter, separados por vírgula. Campos aninhados usam ponto
+      (ex.: "id,product_data.title,product_data.price").
+    - exclude: Campos a remover, no mesmo formato. Não pode ser usado junto com `fields`.
+    """
+
+    fields = serializers.CharField(required=False)
+    exclude = serializers.CharField(required=False)
+
+    def _paths(self, value):
+        paths = [path.strip() for path in value.split(",") if path.strip()]
+        if not paths:
+            raise serializers.ValidationError("Informe ao menos um campo.")
+        return paths
+
+    def validate_fields(self, value):
+        return self._paths(value)
+
+    def validate_exclude(self, value):
+        return self._paths(value)
+
+    def validate(self, attrs):
+        if "fields" in attrs and "exclude" in attrs:
+            raise serializers.ValidationError(
+                "Informe apenas um entre `fields` e `exclude`."
+            )
+        return attrs
+
+
+def projection(params):
+    """Extrai (e remove de `params`) a projeção validada por `FieldsQuerySerializer`.
+
+    Args:
+        params (dict): parâmetros validados.
+
+    Returns:
+        dict: `fields` ou `exclude`, ou `None` quando não há projeção.
+    """
+    selected = {key: params.pop(key) for key in ("fields", "exclude") if key in params}
+    return selected or None
+
+
+def projection_key(selected):
+    """Retorna o sufixo da chave de cache de uma projeção.
+
+    Args:
+        selected (dict): projeção (ver `projection`).
+
+    Returns:
+        str: sufixo estável para a mesma projeção, independente da ordem dos campos.
+    """
+    return "fields:" + content_hash(
+        {key: sorted(paths) for key, paths in selected.items()}
+    )
+
+
+def _tree(paths):
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            if node.get(part) is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = True
+    return tree
+
+
+def _only(item, tree):
+    if not isinstance(item, dict):
+        return item
+    return {
+        key: item[key] if subtree is True else _only(item[key], subtree)
+        for key, subtree in tree.items()
+        if key in item
+    }
+
+
+def _without(item, tree):
+    if not isinstance(item, dict):
+        return item
+    return {
+        key: _without(value, tree[key]) if key in tree else value
+        for key, value in item.items()
+        if tree.get(key) is not True
+    }
+
+
+def project(data, selected):
+    """Aplica a projeção a um item ou a uma lista de itens.
+
+    Campos inexistentes são ignorados.
+
+    Args:
+        data (dict | list): item ou lista de itens serializados.
+        selected (dict): projeção (ver `projection`); `None` retorna `data` inalterado.
+
+    Returns:
+        dict | list: dados projetados.
+    """
+    if not selected:
+        return data
+
+    if "fields" in selected:
+        tree = _tree(selected["fields"])
+        apply = _only
+    else:
+        tree = _tree(selected["exclude"])
+        apply = _without
+
+    if isinstance(data, list):
+        return [apply(item, tree) for item in data]
+    return apply(data, tree)
@@ -0,0 +1,20 @@
+import hashlib
+import json
+
+
+def content_hash(data):
+    """Calcula o hash do conteúdo de um valor serializável em JSON.
+
+    A serialização é canônica (chaves ordenadas, sem espaços), então valores iguais
+    geram o mesmo hash independentemente da ordem das chaves.
+
+    Args:
+        data (object): valor serializável em JSON.
+
+    Returns:
+        str: hash SHA-256 em hexadecimal.
+    """
+    payload = json.dumps(
+        data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
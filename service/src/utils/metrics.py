@@ -0,0 +1,286 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from utils.cache_backends import coordination_cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_pid = None
+_worker = None
+_flusher = None
+_counters = {}
+_histograms = {}
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _ensure_process():
+    """Zera as métricas herdadas do processo pai depois de um fork do gunicorn."""
+    global _pid, _worker
+
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _worker = f"{socket.gethostname()}:{_pid}"
+        _counters.clear()
+        _histograms.clear()
+
+
+def cache_namespace(key):
+    """Retorna o namespace de métricas de uma chave do cache.
+
+    Args:
+        key (str): chave do cache.
+
+    Returns:
+        str: "product", "catalog", "favorites" ou o prefixo da chave.
+    """
+    parts = key.split(":")
+    if parts[:2] == ["fakestore", "product"]:
+        return "product"
+    if parts[:2] == ["fakestore", "all_products"]:
+        return "catalog" if len(parts) == 2 else "favorites"
+    return parts[0]
+
+
+def inc(name, labels=None, value=1):
+    """Incrementa um contador.
+
+    Args:
+        name (str): nome da métrica.
+        labels (dict): labels da série.
+        value (int): valor a somar.
+    """
+    with _lock:
+        _ensure_process()
+        series = (name, _labels_key(labels))
+        _counters[series] = _counters.get(series, 0) + value
+    _ensure_flusher()
+
+
+def observe(name, seconds, labels=None):
+    """Registra uma duração no histograma de latência.
+
+    Args:
+        name (str): nome da métrica.
+        seconds (float): duração observada, em segundos.
+        labels (dict): labels da série.
+    """
+    with _lock:
+        _ensure_process()
+        series = (name, _labels_key(labels))
+        histogram = _histograms.get(series)
+        if histogram is None:
+            histogram = _histograms[series] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        histogram[-2] += seconds
+        histogram[-1] += 1
+    _ensure_flusher()
+
+
+@contextmanager
+def timer(name, labels=None):
+    """Mede o tempo do bloco e o registra em `observe`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, labels)
+
+
+def _ensure_flusher():
+    """Garante que o processo tem uma thread publicando as métricas.
+
+    `inc`/`observe` rodam também no event loop (views, proxy e cliente
+    assíncronos) e o flush faz I/O no cache compartilhado, então ele nunca roda na
+    requisição: uma thread por processo chama `flush` a cada
+    `METRICS_FLUSH_INTERVAL` segundos. Depois de um fork a thread do pai não
+    existe no filho, e uma nova é criada na primeira métrica.
+    """
+    global _flusher
+
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_loop, name="metrics:flush", daemon=True
+            )
+            _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.warning("Falha ao publicar as métricas.", exc_info=True)
+
+
+def _register(worker):
+    """Registra o worker em `metrics:workers`, descartando os que expiraram.
+
+    O registro guarda até quando cada worker é considerado vivo. A cada flush o
+    worker confere a própria entrada (uma leitura) e só a regrava quando falta ou
+    já passou da metade de `METRICS_RETENTION`; workers parados (restart, deploy,
+    comandos) deixam de renovar e saem da lista sozinhos.
+    """
+    now = time.time()
+    registry = coordination_cache().get("metrics:workers") or {}
+    if registry.get(worker, 0) - now > settings.METRICS_RETENTION / 2:
+        return
+
+    if not coordination_cache().add("metrics:workers:lock", True, 5):
+        return
+    try:
+        registry = coordination_cache().get("metrics:workers") or {}
+        registry = {key: value for key, value in registry.items() if value > now}
+        registry[worker] = now + settings.METRICS_RETENTION
+        coordination_cache().set("metrics:workers", registry, None)
+    finally:
+        coordination_cache().delete("metrics:workers:lock")
+
+
+def flush():
+    """Publica as métricas do worker no cache compartilhado.
+
+    Cada worker grava um snapshot acumulado em uma chave própria
+    (`metrics:worker:{hostname}:{pid}`, expirando em `METRICS_RETENTION`), com uma
+    única escrita por intervalo; a agregação entre os workers é feita na leitura,
+    em `collect`.
+    """
+    with _lock:
+        _ensure_process()
+        snapshot = {
+            "counters": dict(_counters),
+            "histograms": {
+                series: list(values) for series, values in _histograms.items()
+            },
+        }
+        worker = _worker
+
+    coordination_cache().set(
+        f"metrics:worker:{worker}", snapshot, settings.METRICS_RETENTION
+    )
+    _register(worker)
+
+
+def collect():
+    """Soma os snapshots dos workers registrados em `metrics:workers`.
+
+    Returns:
+        dict: contadores e histogramas agregados, no formato do snapshot de `flush`.
+    """
+    flush()
+
+    now = time.time()
+    registry = coordination_cache().get("metrics:workers") or {}
+    workers = {worker for worker, expires_at in registry.items() if expires_at > now}
+    workers.add(_worker)
+    snapshots = coordination_cache().get_many(
+        [f"metrics:worker:{worker}" for worker in sorted(workers)]
+    )
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots.values():
+        for series, value in snapshot["counters"].items():
+            counters[series] = counters.get(series, 0) + value
+        for series, values in snapshot["histograms"].items():
+            total = histograms.setdefault(series, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return {"counters": counters, "histograms": histograms}
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in items
+    )
+    return "{" + pairs + "}"
+
+
+def render():
+    """Renderiza as métricas agregadas no formato de texto do Prometheus.
+
+    Returns:
+        str: métricas no formato de exposição 0.0.4.
+    """
+    collected = collect()
+    lines = []
+
+    typed = set()
+    for (name, labels), value in sorted(collected["counters"].items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), values in sorted(collected["histograms"].items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values):
+            cumulative += count
+            lines.append(
+                f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}"
+            )
+        lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {values[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _record_request(request, response, started):
+    match = request.resolver_match
+    labels = {
+        "view": (match.view_name or match.route) if match else "unmatched",
+        "method": request.method,
+    }
+    inc("aiqfome_http_requests_total", {**labels, "status": response.status_code})
+    observe("aiqfome_http_request_seconds", time.perf_counter() - started, labels)
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """Middleware que registra a contagem e a latência das requisições por view."""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started = time.perf_counter()
+            response = await get_response(request)
+            _record_request(request, response, started)
+            return response
+
+    else:
+
+        def middleware(request):
+            started = time.perf_counter()
+            response = get_response(request)
+            _record_request(request, response, started)
+            return response
+
+    return middleware
@@ -0,0 +1,279 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from aiqfome.models import Product
+from utils import fakestore_client, proxy_cache
+from utils.fakestore_client import UpstreamError
+
+CATALOG_KEY = "fakestore:all_products"
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class ProductUnavailable(APIException):
+    """Produto não pôde ser consultado porque a FakeStore API está indisponível."""
+
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "Erro ao acessar API externa."
+    default_code = "bad_gateway"
+
+
+@dataclass(frozen=True)
+class ProductResult:
+    """Resultado de uma consulta ao cache do proxy de produtos.
+
+    Atributos:
+        - entry (dict): entrada do cache (ver `proxy_cache.get_entry`), só com o corpo
+          já renderizado quando `PROXY_CACHE_RENDERED` está ligado.
+    """
+
+    entry: dict
+
+    @property
+    def data(self):
+        """Produto (ou lista de produtos, no catálogo), decodificado a cada acesso."""
+        return proxy_cache.entry_data(self.entry)
+
+    @property
+    def etag(self):
+        """Hash do conteúdo, usado como ETag."""
+        return self.entry["etag"]
+
+    @property
+    def is_stale(self):
+        """Valor passou do `PROXY_CACHE_SOFT_TIMEOUT` e está sendo atualizado em segundo plano."""
+        return time.time() >= self.entry["stale_at"]
+
+    @property
+    def is_fallback(self):
+        """Upstream indisponível; é o último valor válido conhecido."""
+        return self.entry["stale_at"] == 0
+
+
+@dataclass(frozen=True)
+class ProductBatchResult:
+    """Resultado de uma consulta de produtos em lote.
+
+    Atributos:
+        - found (dict): `ProductResult` por ID, na ordem pedida.
+        - not_found (list): IDs que não existem.
+        - unavailable (list): IDs indisponíveis no upstream e sem último valor válido.
+    """
+
+    found: dict = field(default_factory=dict)
+    not_found: list = field(default_factory=list)
+    unavailable: list = field(default_factory=list)
+
+
+def product_key(pk):
+    """Retorna a chave do cache de um produto."""
+    return f"fakestore:product:{pk}"
+
+
+def _parse_catalog(response):
+    if response.status_code != 200:
+        raise UpstreamError(f"FakeStore respondeu {response.status_code}.")
+    return response.json()
+
+
+def _parse_product(response):
+    if response.status_code != 200:
+        raise UpstreamError(f"FakeStore respondeu {response.status_code}.")
+    elif not response.content:
+        raise NotFound(detail="Produto não encontrado.")
+    return response.json()
+
+
+def _catalog_fan_out(data):
+    return {product_key(product["id"]): product for product in data}
+
+
+def _fetch_all_products():
+    if settings.PRODUCT_CATALOG_SOURCE == "database":
+        return list(Product.objects.values_list("data", flat=True))
+    return _parse_catalog(fakestore_client.get())
+
+
+def _load_all_products():
+    data = _fetch_all_products()
+    proxy_cache.store_many(_catalog_fan_out(data))
+    return data
+
+
+def _fetch_product(pk):
+    if settings.PRODUCT_CATALOG_SOURCE == "database":
+        product = None
+        if str(pk).isdigit():
+            product = (
+                Product.objects.filter(pk=pk).values_list("data", flat=True).first()
+            )
+        if product is None:
+            raise NotFound(detail="Produto não encontrado.")
+        return product
+
+    return _parse_product(fakestore_client.get(f"/{pk}"))
+
+
+def _batch_executor():
+    """Retorna o executor das buscas em lote, um por processo.
+
+    É compartilhado por todas as requisições, então o limite vale para o processo:
+    no máximo `PROXY_BATCH_MAX_WORKERS` buscas simultâneas, nunca mais que as
+    `FAKESTORE_POOL_MAXSIZE` conexões do pool da sessão HTTP. As threads são
+    reaproveitadas, assim como as conexões ao cache compartilhado que abrem (circuit
+    breaker e métricas). Depois de um fork, o filho cria o seu.
+    """
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=min(
+                    settings.PROXY_BATCH_MAX_WORKERS, settings.FAKESTORE_POOL_MAXSIZE
+                ),
+                thread_name_prefix="product-batch",
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _fetch_product_or_error(pk):
+    try:
+        return _fetch_product(pk)
+    except (NotFound, UpstreamError) as e:
+        return e
+
+
+def _fetch_products(pks):
+    """Busca vários produtos; o resultado de cada um é o dado ou a exceção da busca.
+
+    Na base local é uma única consulta; no upstream as buscas rodam em paralelo no
+    executor do processo (ver `_batch_executor`).
+    """
+    if settings.PRODUCT_CATALOG_SOURCE == "database":
+        rows = dict(Product.objects.filter(id__in=pks).values_list("id", "data"))
+        return {
+            pk: rows.get(pk, NotFound(detail="Produto não encontrado.")) for pk in pks
+        }
+
+    return dict(zip(pks, _batch_executor().map(_fetch_product_or_error, pks)))
+
+
+def _load_products(keys):
+    pks = [int(key.rsplit(":", 1)[1]) for key in keys]
+    results = _fetch_products(pks)
+    return {product_key(pk): results[pk] for pk in pks}
+
+
+async def _aload_all_products():
+    if settings.PRODUCT_CATALOG_SOURCE == "database":
+        data = await sync_to_async(_fetch_all_products)()
+    else:
+        data = _parse_catalog(await fakestore_client.aget())
+    await proxy_cache.astore_many(_catalog_fan_out(data))
+    return data
+
+
+async def _afetch_product(pk):
+    if settings.PRODUCT_CATALOG_SOURCE == "database":
+        return await sync_to_async(_fetch_product)(pk)
+    return _parse_product(await fakestore_client.aget(f"/{pk}"))
+
+
+def get_catalog():
+    """Retorna o catálogo completo a partir do cache do proxy.
+
+    Um miss carrega o catálogo e grava também a entrada de cada produto. As
+    semânticas de cache são as de `proxy_cache.get_entry`.
+
+    Returns:
+        ProductResult: catálogo.
+
+    Raises:
+        UpstreamError: quando o upstream está indisponível e não há último valor válido.
+    """
+    return ProductResult(proxy_cache.get_entry(CATALOG_KEY, _load_all_products))
+
+
+def refresh_catalog():
+    """Recarrega o catálogo completo no upstream e atualiza o cache do proxy.
+
+    Ao contrário de `get_catalog`, nunca devolve uma entrada velha; para tarefas que
+    gravam o catálogo em outro lugar (ex.: `refresh_favorite_snapshots`).
+
+    Returns:
+        ProductResult: catálogo; `is_fallback` quando o upstream está indisponível.
+
+    Raises:
+        UpstreamError: quando o upstream está indisponível e não há último valor válido.
+    """
+    return ProductResult(proxy_cache.refresh_entry(CATALOG_KEY, _load_all_products))
+
+
+def get_product(pk):
+    """Retorna um produto a partir do cache do proxy.
+
+    O valor pode estar velho (ver `ProductResult.is_stale`) ou ser o último valor
+    válido com o upstream fora (`ProductResult.is_fallback`). Produtos inexistentes
+    ficam em cache negativo por `PROXY_CACHE_NEGATIVE_TIMEOUT`.
+
+    Args:
+        pk (int | str): ID do produto.
+
+    Returns:
+        ProductResult: produto.
+
+    Raises:
+        NotFound: quando o produto não existe.
+        UpstreamError: quando o upstream está indisponível e não há último valor válido.
+    """
+    return ProductResult(
+        proxy_cache.get_entry(product_key(pk), lambda: _fetch_product(pk))
+    )
+
+
+def get_products(pks):
+    """Retorna vários produtos, buscando no upstream apenas os que não estão em cache.
+
+    Args:
+        pks (list): IDs dos produtos.
+
+    Returns:
+        ProductBatchResult: produtos encontrados, inexistentes e indisponíveis.
+    """
+    entries = proxy_cache.get_many_entries(
+        [product_key(pk) for pk in pks], _load_products
+    )
+
+    result = ProductBatchResult()
+    for pk in pks:
+        entry = entries.get(product_key(pk))
+        if entry is None:
+            result.unavailable.append(pk)
+        elif "missing" in entry:
+            result.not_found.append(pk)
+        else:
+            result.found[pk] = ProductResult(entry)
+    return result
+
+
+async def aget_catalog():
+    """Versão assíncrona de `get_catalog`."""
+    return ProductResult(await proxy_cache.aget_entry(CATALOG_KEY, _aload_all_products))
+
+
+async def aget_product(pk):
+    """Versão assíncrona de `get_product`."""
+    return ProductResult(
+        await proxy_cache.aget_entry(product_key(pk), lambda: _afetch_product(pk))
+    )
@@ -0,0 +1,550 @@
+import asyncio
+import gzip
+import json
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from utils import metrics
+from utils.cache_backends import coordination_cache
+from utils.fakestore_client import UpstreamError
+from utils.hashing import content_hash
+
+logger = logging.getLogger(__name__)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_ainflight = weakref.WeakKeyDictionary()
+_background_tasks = set()
+
+
+def _record_lookup(key, entry):
+    """Contabiliza o resultado de uma leitura do cache no namespace da chave."""
+    if entry is None:
+        result = "miss"
+    elif "missing" in entry:
+        result = "negative_hit"
+    elif time.time() >= entry["stale_at"]:
+        result = "stale"
+    else:
+        result = "hit"
+    metrics.inc(
+        "aiqfome_cache_requests_total",
+        {"namespace": metrics.cache_namespace(key), "result": result},
+    )
+
+
+def _record_fallback(key):
+    metrics.inc(
+        "aiqfome_cache_last_good_total", {"namespace": metrics.cache_namespace(key)}
+    )
+
+
+class _InFlightCall:
+    """Busca em andamento para uma chave, compartilhada entre as threads do processo."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(key, fn):
+    """Executa `fn` uma única vez por chave entre as threads do processo.
+
+    A primeira thread a pedir a chave executa `fn`; as demais aguardam e recebem o
+    mesmo resultado (ou a mesma exceção).
+
+    Args:
+        key (str): identificador da operação.
+        fn (callable): função sem argumentos que produz o resultado.
+
+    Returns:
+        object: resultado de `fn`.
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _InFlightCall()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+    return call.result
+
+
+def _timeouts():
+    """Retorna os TTLs (soft, hard) das entradas do proxy, em segundos."""
+    soft = settings.PROXY_CACHE_SOFT_TIMEOUT
+    if not settings.PROXY_CACHE_STALE_WHILE_REVALIDATE:
+        return soft, soft
+    return soft, max(soft, settings.PROXY_CACHE_HARD_TIMEOUT)
+
+
+def _entry(data, stale_at):
+    """Monta o envelope de uma entrada, com o ETag calculado uma única vez.
+
+    Com `PROXY_CACHE_RENDERED`, a entrada guarda só o corpo JSON já renderizado
+    (`body`) e, acima de `PROXY_CACHE_GZIP_MIN_LENGTH` bytes, sua versão gzip
+    (`body_gzip`), no lugar dos objetos Python: um hit serve os bytes sem
+    desserializar nem serializar os dados de novo. Quem precisa dos dados usa
+    `entry_data`.
+    """
+    entry = {"etag": content_hash(data), "stale_at": stale_at}
+    if not settings.PROXY_CACHE_RENDERED:
+        entry["data"] = data
+        return entry
+
+    entry["body"] = JSONRenderer().render(data)
+    entry["content_type"] = "application/json"
+    if (
+        settings.PROXY_CACHE_GZIP
+        and len(entry["body"]) >= settings.PROXY_CACHE_GZIP_MIN_LENGTH
+    ):
+        entry["body_gzip"] = gzip.compress(entry["body"])
+    return entry
+
+
+def entry_data(entry):
+    """Retorna os dados de uma entrada, decodificando o corpo renderizado se preciso.
+
+    Args:
+        entry (dict): entrada do cache (ver `get_entry`).
+
+    Returns:
+        object: dados da entrada (`None` em entradas negativas).
+    """
+    if "body" in entry:
+        return json.loads(entry["body"])
+    return entry["data"]
+
+
+def _store(key, data):
+    """Grava `data` envelopado com o instante em que passa a ser considerado velho.
+
+    A entrada expira do cache no TTL hard; entre o soft e o hard ela ainda é
+    servida enquanto uma atualização roda em segundo plano.
+    """
+    soft, hard = _timeouts()
+    entry = _entry(data, time.time() + soft)
+    cache.set(key, entry, hard)
+    cache.set(f"{key}:last_good", data, settings.PROXY_CACHE_LAST_GOOD_TIMEOUT)
+    return entry
+
+
+def _missing_entry(detail):
+    """Monta uma entrada negativa (produto inexistente)."""
+    timeout = settings.PROXY_CACHE_NEGATIVE_TIMEOUT
+    return {"data": None, "missing": str(detail), "stale_at": time.time() + timeout}
+
+
+def _store_missing(key, detail):
+    """Grava uma entrada negativa com TTL próprio e mais curto."""
+    entry = _missing_entry(detail)
+    cache.set(key, entry, settings.PROXY_CACHE_NEGATIVE_TIMEOUT)
+    return entry
+
+
+def _load(key, loader):
+    """Chama `loader` e grava o resultado; `NotFound` vira uma entrada negativa.
+
+    Se o upstream estiver indisponível (erro ou circuito aberto), devolve o último
+    valor válido conhecido sem gravá-lo como entrada nova.
+    """
+    try:
+        with metrics.timer(
+            "aiqfome_cache_load_seconds", {"namespace": metrics.cache_namespace(key)}
+        ):
+            data = loader()
+    except NotFound as e:
+        return _store_missing(key, e.detail)
+    except UpstreamError:
+        last_good = cache.get(f"{key}:last_good")
+        if last_good is None:
+            raise
+        _record_fallback(key)
+        logger.warning("Upstream indisponível, servindo último valor de %s.", key)
+        return _entry(last_good, 0)
+    return _store(key, data)
+
+
+def _unwrap(entry):
+    """Devolve a entrada, relançando `NotFound` para entradas negativas."""
+    if "missing" in entry:
+        raise NotFound(detail=entry["missing"])
+    return entry
+
+
+def store_many(mapping):
+    """Grava várias entradas de uma vez com `set_many`, no mesmo formato de `get_entry`.
+
+    Args:
+        mapping (dict): dicionário de chave do cache para o valor a ser gravado.
+
+    Returns:
+        dict: entradas gravadas, por chave.
+    """
+    soft, hard = _timeouts()
+    stale_at = time.time() + soft
+    entries = {key: _entry(data, stale_at) for key, data in mapping.items()}
+    cache.set_many(entries, hard)
+    cache.set_many(
+        {f"{key}:last_good": data for key, data in mapping.items()},
+        settings.PROXY_CACHE_LAST_GOOD_TIMEOUT,
+    )
+    return entries
+
+
+def _store_results(results):
+    """Grava o resultado de um `load_many`, devolvendo as entradas por chave.
+
+    Valores viram entradas normais, `NotFound` vira entrada negativa e
+    `UpstreamError` cai para o último valor válido conhecido; chaves sem ele ficam
+    fora do retorno.
+    """
+    found = {}
+    missing = {}
+    unavailable = []
+    for key, result in results.items():
+        if isinstance(result, NotFound):
+            missing[key] = _missing_entry(result.detail)
+        elif isinstance(result, UpstreamError):
+            unavailable.append(key)
+        else:
+            found[key] = result
+
+    entries = store_many(found) if found else {}
+    if missing:
+        cache.set_many(missing, settings.PROXY_CACHE_NEGATIVE_TIMEOUT)
+        entries.update(missing)
+
+    if unavailable:
+        last_good = cache.get_many([f"{key}:last_good" for key in unavailable])
+        for key in unavailable:
+            if f"{key}:last_good" in last_good:
+                _record_fallback(key)
+                entries[key] = _entry(last_good[f"{key}:last_good"], 0)
+    return entries
+
+
+def _refresh_in_background(key, loader):
+    """Dispara a atualização de uma entrada velha, no máximo uma por chave."""
+    lock_key = f"{key}:refresh"
+    if not coordination_cache().add(lock_key, True, settings.PROXY_LOCK_TIMEOUT):
+        return
+
+    def run():
+        try:
+            _load(key, loader)
+        except Exception:
+            logger.warning(
+                "Falha ao atualizar %s em segundo plano.", key, exc_info=True
+            )
+        finally:
+            coordination_cache().delete(lock_key)
+            connections.close_all()
+
+    threading.Thread(target=run, name=f"refresh:{key}", daemon=True).start()
+
+
+def _load_with_lock(key, loader):
+    """Carrega o valor coordenando os workers por meio de um lock curto no cache.
+
+    O worker que obtém o lock chama `loader` e grava o resultado; os demais
+    aguardam o valor aparecer no cache. Se o lock expirar ou for liberado sem
+    valor (ex.: falha no upstream), o worker busca por conta própria.
+    """
+    lock_key = f"{key}:lock"
+
+    if coordination_cache().add(lock_key, True, settings.PROXY_LOCK_TIMEOUT):
+        try:
+            entry = cache.get(key)
+            if entry is None:
+                entry = _load(key, loader)
+            return entry
+        finally:
+            coordination_cache().delete(lock_key)
+
+    deadline = time.monotonic() + settings.PROXY_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.PROXY_LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if coordination_cache().get(lock_key) is None:
+            break
+
+    return _load(key, loader)
+
+
+def get_entry(key, loader):
+    """Retorna a entrada em cache ou a carrega com coalescência de requisições.
+
+    Entradas mais velhas que `PROXY_CACHE_SOFT_TIMEOUT` são servidas na hora
+    enquanto uma atualização roda em segundo plano (stale-while-revalidate); a
+    requisição só espera o upstream quando a entrada não existe mais (após
+    `PROXY_CACHE_HARD_TIMEOUT`). Com o upstream indisponível, o último valor
+    válido (`PROXY_CACHE_LAST_GOOD_TIMEOUT`) é servido no lugar do erro.
+
+    Quando `loader` lança `NotFound`, uma entrada negativa é gravada por
+    `PROXY_CACHE_NEGATIVE_TIMEOUT` e as próximas chamadas lançam `NotFound` sem
+    consultar o upstream.
+
+    Em caso de miss, apenas uma busca por chave roda por vez: threads do mesmo
+    processo aguardam o resultado em memória e workers diferentes se coordenam
+    por um lock no cache.
+
+    Args:
+        key (str): chave do cache.
+        loader (callable): função sem argumentos que busca o valor no upstream.
+
+    Returns:
+        dict: entrada com o valor (`data`, ou `body` já renderizado; ver
+        `entry_data`), seu ETag (`etag`) e o instante em que passa a ser
+        considerada velha (`stale_at`).
+
+    Raises:
+        NotFound: quando o valor não existe no upstream.
+    """
+    with metrics.timer(
+        "aiqfome_cache_lookup_seconds", {"namespace": metrics.cache_namespace(key)}
+    ):
+        entry = cache.get(key)
+        _record_lookup(key, entry)
+        if entry is None:
+            entry = single_flight(key, lambda: _load_with_lock(key, loader))
+        elif "missing" not in entry and time.time() >= entry["stale_at"]:
+            _refresh_in_background(key, loader)
+    return _unwrap(entry)
+
+
+def refresh_entry(key, loader):
+    """Carrega o valor no upstream agora e grava a entrada, ignorando a que está em cache.
+
+    Não serve entradas velhas nem dispara atualização em segundo plano; com o
+    upstream indisponível, devolve o último valor válido (`stale_at` 0), como
+    `get_entry`.
+
+    Args:
+        key (str): chave do cache.
+        loader (callable): função sem argumentos que busca o valor no upstream.
+
+    Returns:
+        dict: entrada com o valor (ver `get_entry`).
+
+    Raises:
+        NotFound: quando o valor não existe no upstream.
+    """
+    return _unwrap(_load(key, loader))
+
+
+def get_many_entries(keys, load_many):
+    """Versão em lote de `get_entry`: um `get_many` para os hits e uma carga para os misses.
+
+    Os misses são carregados por uma única chamada a `load_many` e gravados com
+    `set_many`. Entradas velhas são servidas e atualizadas em segundo plano, em uma
+    única chamada a `load_many`.
+
+    Args:
+        keys (list): chaves do cache.
+        load_many (callable): recebe a lista de chaves sem entrada e retorna um
+            dicionário de chave para o valor, ou para a exceção (`NotFound` ou
+            `UpstreamError`) daquela chave.
+
+    Returns:
+        dict: entradas por chave, incluindo as negativas (com a chave `missing`).
+        Chaves indisponíveis no upstream e sem último valor válido ficam de fora.
+    """
+    entries = cache.get_many(keys)
+    for key in keys:
+        _record_lookup(key, entries.get(key))
+
+    now = time.time()
+    stale = [
+        key
+        for key, entry in entries.items()
+        if "missing" not in entry and now >= entry["stale_at"]
+    ]
+    stale = [
+        key
+        for key in stale
+        if coordination_cache().add(f"{key}:refresh", True, settings.PROXY_LOCK_TIMEOUT)
+    ]
+    if stale:
+
+        def refresh():
+            try:
+                _store_results(load_many(stale))
+            except Exception:
+                logger.warning(
+                    "Falha ao atualizar lote em segundo plano.", exc_info=True
+                )
+            finally:
+                coordination_cache().delete_many([f"{key}:refresh" for key in stale])
+                connections.close_all()
+
+        threading.Thread(target=refresh, name="refresh:batch", daemon=True).start()
+
+    misses = [key for key in keys if key not in entries]
+    if misses:
+        entries.update(_store_results(load_many(misses)))
+    return entries
+
+
+async def _asingle_flight(key, fn):
+    """Versão assíncrona de `single_flight`, por event loop.
+
+    A busca roda em uma task própria, aguardada com `shield` por todas as
+    requisições da chave: se a requisição que a iniciou for cancelada (ex.: cliente
+    desconectou), a busca continua e as demais recebem o resultado.
+    """
+    loop = asyncio.get_running_loop()
+    calls = _ainflight.setdefault(loop, {})
+
+    task = calls.get(key)
+    if task is None:
+        task = calls[key] = loop.create_task(fn())
+
+        def done(task):
+            calls.pop(key, None)
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(done)
+    return await asyncio.shield(task)
+
+
+async def _astore(key, data):
+    """Versão assíncrona de `_store`."""
+    soft, hard = _timeouts()
+    entry = _entry(data, time.time() + soft)
+    await cache.aset(key, entry, hard)
+    await cache.aset(f"{key}:last_good", data, settings.PROXY_CACHE_LAST_GOOD_TIMEOUT)
+    return entry
+
+
+async def _aload(key, loader):
+    """Versão assíncrona de `_load`; `loader` é uma corrotina."""
+    try:
+        with metrics.timer(
+            "aiqfome_cache_load_seconds", {"namespace": metrics.cache_namespace(key)}
+        ):
+            data = await loader()
+    except NotFound as e:
+        entry = _missing_entry(e.detail)
+        await cache.aset(key, entry, settings.PROXY_CACHE_NEGATIVE_TIMEOUT)
+        return entry
+    except UpstreamError:
+        last_good = await cache.aget(f"{key}:last_good")
+        if last_good is None:
+            raise
+        _record_fallback(key)
+        logger.warning("Upstream indisponível, servindo último valor de %s.", key)
+        return _entry(last_good, 0)
+    return await _astore(key, data)
+
+
+async def astore_many(mapping):
+    """Versão assíncrona de `store_many`."""
+    soft, hard = _timeouts()
+    stale_at = time.time() + soft
+    await cache.aset_many(
+        {key: _entry(data, stale_at) for key, data in mapping.items()},
+        hard,
+    )
+    await cache.aset_many(
+        {f"{key}:last_good": data for key, data in mapping.items()},
+        settings.PROXY_CACHE_LAST_GOOD_TIMEOUT,
+    )
+
+
+async def _arefresh_in_background(key, loader):
+    """Versão assíncrona de `_refresh_in_background`, em uma task do event loop."""
+    lock_key = f"{key}:refresh"
+    if not await coordination_cache().aadd(lock_key, True, settings.PROXY_LOCK_TIMEOUT):
+        return
+
+    async def run():
+        try:
+            await _aload(key, loader)
+        except Exception:
+            logger.warning(
+                "Falha ao atualizar %s em segundo plano.", key, exc_info=True
+            )
+        finally:
+            await coordination_cache().adelete(lock_key)
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _aload_with_lock(key, loader):
+    """Versão assíncrona de `_load_with_lock`."""
+    lock_key = f"{key}:lock"
+
+    if await coordination_cache().aadd(lock_key, True, settings.PROXY_LOCK_TIMEOUT):
+        try:
+            entry = await cache.aget(key)
+            if entry is None:
+                entry = await _aload(key, loader)
+            return entry
+        finally:
+            await coordination_cache().adelete(lock_key)
+
+    deadline = time.monotonic() + settings.PROXY_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.PROXY_LOCK_POLL_INTERVAL)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry
+        if await coordination_cache().aget(lock_key) is None:
+            break
+
+    return await _aload(key, loader)
+
+
+async def aget_entry(key, loader):
+    """Versão assíncrona de `get_entry`, com as mesmas garantias.
+
+    Args:
+        key (str): chave do cache.
+        loader (callable): corrotina sem argumentos que busca o valor no upstream.
+
+    Returns:
+        dict: entrada do cache (ver `get_entry`).
+
+    Raises:
+        NotFound: quando o valor não existe no upstream.
+    """
+    with metrics.timer(
+        "aiqfome_cache_lookup_seconds", {"namespace": metrics.cache_namespace(key)}
+    ):
+        entry = await cache.aget(key)
+        _record_lookup(key, entry)
+        if entry is None:
+            entry = await _asingle_flight(key, lambda: _aload_with_lock(key, loader))
+        elif "missing" not in entry and time.time() >= entry["stale_at"]:
+            await _arefresh_in_background(key, loader)
+    return _unwrap(entry)